@@ -1,9 +1,73 @@
 import streamlit as st
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
 from datetime import datetime
-import io
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import kmais
+from kmais import (
+    CHART_BUILDERS,
+    FONTE_PADRAO,
+    GRANULARITIES,
+    ROLLING_WINDOWS,
+    DatasetRegistry,
+    EXPORT_FORMATS,
+    QUERY_MAX_ROWS,
+    RECURRENCE_WINDOW_DAYS,
+    aggregate_cube,
+    annual_evolution,
+    browse_order,
+    concat_nc_batches,
+    drill_history,
+    drill_matrix,
+    export_bytes,
+    filter_options,
+    filter_rows,
+    filter_state_key,
+    format_anomalies,
+    format_records,
+    format_recurrences,
+    iter_record_chunks,
+    kpi_summary,
+    ingest_workbooks,
+    known_categories,
+    list_delta_snapshots,
+    list_workbooks,
+    load_normalization_rules,
+    load_source_frame,
+    merge_cubes,
+    merge_key_hashes,
+    new_record_mask,
+    page_count,
+    page_rows,
+    ranking_table,
+    record_key_hashes,
+    rollup_cube,
+    save_delta_snapshot,
+    search_mask,
+    slice_cube,
+    slice_anomalies,
+    sorted_key_hashes,
+    source_version,
+    sql_annual_evolution,
+    sql_kpi_summary,
+    sql_rollup,
+    time_series,
+    validate_workbook,
+)
+from kmais.report import kpi_cards_html
+
+# Dados compartilhados entre sessões: escrita em um df gera cópia em vez de alterar o original
+pd.set_option('mode.copy_on_write', True)
 
 # Configuração da página
 st.set_page_config(
@@ -100,254 +164,568 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+# Versões de dados mantidas em cache (cubo, hashes e índice de filtros)
+CUBE_CACHE_MAX_ENTRIES = 16
+
+# Figuras Plotly memoizadas por (versão dos dados, filtros, gráfico)
+FIGURE_CACHE_MAX_ENTRIES = 64
+
+# Navegador de registros: tamanhos de página e combinações (versão, filtros, busca) em cache
+RECENT_PAGE_SIZES = [20, 50, 100]
+BROWSE_CACHE_MAX_ENTRIES = 32
+
+# Recorrências e anomalias: linhas exibidas em cada tabela
+ANOMALY_TABLE_ROWS = 50
+
+# Exportação: conjuntos oferecidos (rótulo → registros filtrados ou ranking da dimensão) e arquivos em cache
+EXPORT_DATASETS = {
+    "Registros filtrados": 'registros',
+    "Clientes (ranking completo)": 'cliente',
+    "Tipos (ranking completo)": 'tipo'
+}
+EXPORT_CACHE_MAX_ENTRIES = 8
+
+# Série temporal: rótulos da interface → granularidade e métrica do kmais.timeseries
+SERIES_GRANULARITIES = {"Mensal": 'mensal', "Semanal": 'semanal'}
+SERIES_METRICS = {"Número de NCs": 'ncs', "Volume (kg)": 'volume_impactado'}
+
+# Modos de upload (o acréscimo deduplica pela chave kmais.DEDUP_KEY)
+MODO_SUBSTITUIR = "Substituir dados"
+MODO_ACRESCENTAR = "Acrescentar à fonte selecionada"
+
+# Limites do registro compartilhado: versões sem sessão são descartadas (LRU) acima deles
+REGISTRY_MAX_BYTES = 1024 * 1024 * 1024
+REGISTRY_MAX_IDLE_VERSIONS = 8
+
+# Seções da página: as desmarcadas no sidebar não são calculadas nem enviadas ao navegador
+PAGE_SECTIONS = ["KPIs", "Análise Visual", "Série Temporal", "Análise Horizontal", "Drill-down", "Anomalias", "Recentes"]
+
+# Seções com widgets próprios rodam como fragmento quando o Streamlit oferece (st.fragment):
+# uma interação nelas reexecuta só a seção; sem fragmentos, o decorador não altera nada
+section_fragment = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None) or (lambda func: func)
+
+# Cliques em gráficos (st.plotly_chart com on_select) só existem em versões mais novas do Streamlit;
+# sem eles, a célula do drill-down é escolhida pelos seletores abaixo do mapa de calor
+PLOTLY_SELECTION = 'on_select' in inspect.signature(st.plotly_chart).parameters
+
+# Backend SQL opcional (KMAIS_BACKEND=sqlite): agregações e consultas livres numa base SQLite local
+SQL_BACKEND = os.environ.get('KMAIS_BACKEND', '').lower() == 'sqlite'
+QUERY_CACHE_MAX_ENTRIES = 32
+
+# Instrumentação: log estruturado (uma linha JSON por rerun) e painel admin (?admin=1 ou KMAIS_ADMIN=1)
+PERF_LOGGER_NAME = 'kmais.desempenho'
+PERF_LOG_PATH = os.environ.get('KMAIS_PERF_LOG')
+PERF_HISTORY_SIZE = 20
+
 @st.cache_data
 def load_real_data():
     """Carrega dados reais 100% em português com tipos corrigidos"""
     try:
-        data = [
-            # 2025
-            {'data': '2025-06-24', 'ano': 2025, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 410, 'status': 'K069'},
-            {'data': '2025-06-19', 'ano': 2025, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J040'},
-            {'data': '2025-04-08', 'ano': 2025, 'cliente': 'Materne', 'categoria': 'Entrega', 'tipo': 'Paletização', 'volume_impactado': 0, 'status': 'J199'},
-            {'data': '2025-02-18', 'ano': 2025, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 205, 'status': 'J200'},
-            {'data': '2025-02-10', 'ano': 2025, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J183'},
-            {'data': '2025-01-06', 'ano': 2025, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Partículas estranhas', 'volume_impactado': 0, 'status': 'J144'},
-            
-            # 2024
-            {'data': '2024-10-23', 'ano': 2024, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 615, 'status': 'J097'},
-            {'data': '2024-10-02', 'ano': 2024, 'cliente': 'Synertrading', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J110'},
-            {'data': '2024-09-30', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Corpo estranho', 'volume_impactado': 0, 'status': 'J078'},
-            {'data': '2024-09-20', 'ano': 2024, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 205, 'status': 'J029'},
-            {'data': '2024-09-16', 'ano': 2024, 'cliente': 'Sumol', 'categoria': 'Produto', 'tipo': 'Mofo', 'volume_impactado': 205, 'status': 'J101'},
-            {'data': '2024-09-12', 'ano': 2024, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Mofo', 'volume_impactado': 205, 'status': 'J097'},
-            {'data': '2024-09-12', 'ano': 2024, 'cliente': 'Antilles Glaces', 'categoria': 'Entrega', 'tipo': 'Embalagem', 'volume_impactado': 0, 'status': 'J139'},
-            {'data': '2024-09-04', 'ano': 2024, 'cliente': 'Antilles Glaces', 'categoria': 'Produto', 'tipo': 'Mofo', 'volume_impactado': 205, 'status': 'H165'},
-            {'data': '2024-07-02', 'ano': 2024, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 205, 'status': 'J062'},
-            {'data': '2024-06-26', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Corpo estranho', 'volume_impactado': 0, 'status': 'J078'},
-            {'data': '2024-06-12', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Corpo estranho', 'volume_impactado': 0, 'status': 'J078'},
-            {'data': '2024-05-15', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Defeito', 'volume_impactado': 205, 'status': 'J078'},
-            {'data': '2024-04-22', 'ano': 2024, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J029'},
-            {'data': '2024-03-18', 'ano': 2024, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 615, 'status': 'J029'},
-            {'data': '2024-02-14', 'ano': 2024, 'cliente': 'Synertrading', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J110'},
-            
-            # 2023 - TUDO TRADUZIDO PARA PORTUGUÊS
-            {'data': '2023-12-15', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H097'},
-            {'data': '2023-11-22', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H078'},
-            {'data': '2023-10-18', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 410, 'status': 'H165'},
-            {'data': '2023-09-25', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 205, 'status': 'H062'},
-            {'data': '2023-08-30', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 0, 'status': 'H045'},
-            {'data': '2023-07-12', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Documentação', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H097'},
-            {'data': '2023-06-28', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H078'},
-            {'data': '2023-05-15', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 615, 'status': 'H165'},
-            {'data': '2023-04-20', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 410, 'status': 'H062'},
-            {'data': '2023-03-18', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 205, 'status': 'H045'},
-            {'data': '2023-02-22', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'H097'},
-            {'data': '2023-01-25', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H078'},
-            {'data': '2023-12-08', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H165'},
-            {'data': '2023-11-14', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 0, 'status': 'H062'},
-            {'data': '2023-10-05', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 410, 'status': 'H045'},
-            {'data': '2023-09-12', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Documentação', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H097'},
-            {'data': '2023-08-18', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H078'},
-            {'data': '2023-07-25', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 0, 'status': 'H165'},
-            {'data': '2023-06-30', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 0, 'status': 'H062'},
-            {'data': '2023-05-22', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 0, 'status': 'H045'},
-            
-            # 2022 - TUDO TRADUZIDO PARA PORTUGUÊS
-            {'data': '2022-12-15', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 1640, 'status': 'G097'},
-            {'data': '2022-11-20', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'G097'},
-            {'data': '2022-10-25', 'ano': 2022, 'cliente': 'Medibel', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'G078'},
-            {'data': '2022-09-14', 'ano': 2022, 'cliente': 'JFA - LSDH', 'categoria': 'Documentação', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'G029'},
-            {'data': '2022-08-30', 'ano': 2022, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 2460, 'status': 'G045'},
-            {'data': '2022-07-26', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 1640, 'status': 'G097'},
-            {'data': '2022-06-20', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'G097'},
-            {'data': '2022-12-08', 'ano': 2022, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'G078'},
-            {'data': '2022-11-15', 'ano': 2022, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 1025, 'status': 'G165'},
-            {'data': '2022-10-12', 'ano': 2022, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 410, 'status': 'G062'},
-            {'data': '2022-09-28', 'ano': 2022, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 0, 'status': 'G045'},
-            {'data': '2022-08-18', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 1230, 'status': 'G097'},
-            {'data': '2022-07-22', 'ano': 2022, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 205, 'status': 'G078'},
-            {'data': '2022-06-30', 'ano': 2022, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'G165'},
-            {'data': '2022-05-25', 'ano': 2022, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 0, 'status': 'G062'},
-        ]
-        
-        df = pd.DataFrame(data)
-        df['data'] = pd.to_datetime(df['data'])
-        return df
-        
+        return kmais.load_default_data()
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame()
 
-def process_uploaded_data(uploaded_file):
-    """Processa arquivo Excel e traduz tudo para português"""
+@st.cache_resource
+def get_dataset_registry():
+    """Registro de versões dos dados compartilhado por todas as sessões do processo"""
+    return DatasetRegistry(REGISTRY_MAX_BYTES, REGISTRY_MAX_IDLE_VERSIONS, _session_is_active)
+
+@st.cache_resource
+def get_append_lock():
+    """Trava dos acréscimos, compartilhada pelas sessões: um acréscimo parte sempre da versão mais recente"""
+    return threading.Lock()
+
+def _session_id():
+    """Identificador da sessão do navegador que está executando o script"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else 'local'
+
+def _session_is_active(sessao):
+    """Sessões encerradas (aba fechada) deixam de segurar versões dos dados"""
+    if not runtime.exists():
+        return True
+    return runtime.get_instance().is_active_session(sessao)
+
+def _upload_content_hash(uploaded_file):
+    """Calcula o hash do conteúdo da planilha, reaproveitando-o entre reruns"""
+    cached = st.session_state.setdefault('_upload_hashes', {})
+    if uploaded_file.file_id not in cached:
+        cached[uploaded_file.file_id] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return cached[uploaded_file.file_id]
+
+def _ingest_upload(uploaded_files, versao_dados):
+    """Lê e limpa as planilhas enviadas (em paralelo se forem várias), semeando o cache do cubo"""
+    with st.spinner(f"Processando {len(uploaded_files)} planilha(s)..."):
+        df, cubo = ingest_workbooks([(arquivo.name, arquivo.getvalue()) for arquivo in uploaded_files])
+    build_cube(versao_dados, df, cubo)
+    return df
+
+def load_source_data(fonte):
+    """Carrega a fonte escolhida no sidebar, com seus acréscimos, e retorna (df, versão dos dados)"""
+    registro = get_dataset_registry()
     try:
-        df = pd.read_excel(uploaded_file, header=0)
-        
-        # Mapear colunas
-        column_mapping = {}
-        for i, col in enumerate(df.columns):
-            col_lower = str(col).lower()
-            if i == 0 or 'data' in col_lower:
-                column_mapping[col] = 'data'
-            elif i == 1 or 'cliente' in col_lower:
-                column_mapping[col] = 'cliente'
-            elif i == 2 or 'categoria' in col_lower:
-                column_mapping[col] = 'categoria'
-            elif i == 3 or 'tipo' in col_lower:
-                column_mapping[col] = 'tipo'
-            elif 'volume' in col_lower or 'kg' in col_lower:
-                column_mapping[col] = 'volume_impactado'
-            elif 'status' in col_lower:
-                column_mapping[col] = 'status'
-        
-        df = df.rename(columns=column_mapping)
-        
-        # Processar dados
-        df['data'] = pd.to_datetime(df['data'], errors='coerce')
-        df = df.dropna(subset=['data'])
-        df['ano'] = df['data'].dt.year
-        
-        # Limpar dados
-        df['cliente'] = df['cliente'].fillna('N/A').astype(str)
-        df['categoria'] = df['categoria'].fillna('N/A').astype(str)
-        df['tipo'] = df['tipo'].fillna('N/A').astype(str)
-        df['volume_impactado'] = pd.to_numeric(df.get('volume_impactado', 0), errors='coerce').fillna(0)
-        df['status'] = df.get('status', 'N/A').fillna('N/A').astype(str)
-        
-        # TRADUZIR TUDO PARA PORTUGUÊS
-        categoria_map = {
-            'Produit': 'Produto',
-            'Emballage': 'Embalagem',
-            'Documentaire': 'Documentação',
-            'SupplyChain_Livraison': 'Entrega'
-        }
-        df['categoria'] = df['categoria'].map(categoria_map).fillna(df['categoria'])
-        
-        # Traduzir e UNIFICAR tipos de NC
-        tipo_map = {
-            'Endommagement': 'Dano',
-            'Réglementation': 'Regulamentação',
-            'Hors spec': 'Fora de especificação',
-            'Organo': 'Organoléptico',
-            'Tambores fermentados': 'Tambor fermentado',  # UNIFICAR
-            'Tambores fermentados + presença de tambores enfermos': 'Tambor fermentado',
-            'Presença de partículas de polpa branca': 'Partículas estranhas',
-            'Tambores fermentados + Mofo': 'Tambor fermentado'
-        }
-        df['tipo'] = df['tipo'].map(tipo_map).fillna(df['tipo'])
-        
-        # Unificar JFA
-        df['cliente'] = df['cliente'].replace('JFA', 'JFA - LSDH')
-        
-        return df
+        partes = list_delta_snapshots(fonte)
+        versao_dados = source_version(fonte, len(partes))
+        df = registro.get(versao_dados, lambda: load_source_frame(fonte, partes))
+    except Exception as e:
+        st.error(f"Erro ao carregar {fonte}: {e}")
+        return registro.get('padrao', load_real_data), 'padrao'
+    return df, versao_dados
+
+def upload_dataset_version(uploaded_files):
+    """Versão dos dados de um upload: hash do conteúdo (das planilhas, em ordem) + versão das regras"""
+    hashes = [_upload_content_hash(arquivo) for arquivo in uploaded_files]
+    conteudo = hashes[0] if len(hashes) == 1 else hashlib.sha256('|'.join(hashes).encode()).hexdigest()
+    return f"upload:{conteudo}:r{load_normalization_rules()['versao']}"
+
+@st.cache_data(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def validate_upload(conteudo, versao_fonte, versao_regras, _arquivo, _conhecidas):
+    """Validação de uma planilha enviada (cabeçalho + amostra), feita uma vez por (conteúdo, fonte, regras).
+    
+    Sem fonte em memória (versao_fonte None), as categorias não são comparadas.
+    """
+    return validate_workbook(_arquivo.getvalue(), _conhecidas)
+
+def validate_uploads(uploaded_files, fonte):
+    """Valida as planilhas antes da ingestão, mostrando erros e avisos; True se nenhuma foi recusada"""
+    # Categorias novas são as que a fonte selecionada ainda não tem; a fonte só é consultada se já
+    # estiver em memória (carregá-la, ou regerar seu snapshot, tiraria a validação dos milissegundos)
+    versao_fonte = source_version(fonte, len(list_delta_snapshots(fonte)))
+    df_fonte = get_dataset_registry().get(versao_fonte)
+    conhecidas = None
+    if df_fonte is None:
+        versao_fonte = None
+    else:
+        conhecidas = known_categories(df_fonte)
+    versao_regras = load_normalization_rules()['versao']
+    aprovadas = True
+    for arquivo in uploaded_files:
+        relatorio = validate_upload(_upload_content_hash(arquivo), versao_fonte, versao_regras, arquivo, conhecidas)
+        for erro in relatorio['erros']:
+            st.sidebar.error(f"❌ {arquivo.name}: {erro}")
+        for aviso in relatorio['avisos']:
+            st.sidebar.warning(f"⚠️ {arquivo.name}: {aviso}")
+        aprovadas = aprovadas and not relatorio['erros']
+    return aprovadas
+
+def process_uploaded_data(uploaded_files, fonte):
+    """Valida e processa os arquivos Excel, traduzindo tudo para português"""
+    try:
+        # Planilhas recusadas pela amostra não chegam a ser lidas por inteiro nem entram no registro
+        if not validate_uploads(uploaded_files, fonte):
+            return None
+        # Um conjunto de planilhas é processado uma vez por conteúdo; reruns e outras sessões reaproveitam
+        versao_dados = upload_dataset_version(uploaded_files)
+        return get_dataset_registry().get(versao_dados, lambda: _ingest_upload(uploaded_files, versao_dados))
     except Exception as e:
         st.error(f"Erro ao processar arquivo: {e}")
         return None
 
-def create_kpi_cards(df, anos_selecionados):
-    """Cria cards de KPIs"""
-    if anos_selecionados:
-        df_filtrado = df[df['ano'].isin(anos_selecionados)]
-    else:
-        df_filtrado = df
-    
-    total_ncs = len(df_filtrado)
-    volume_total = df_filtrado['volume_impactado'].sum()
-    
-    # Calcular tendência
-    if len(anos_selecionados) >= 2:
-        anos_ord = sorted(anos_selecionados)
-        primeiro = len(df[df['ano'] == anos_ord[0]])
-        ultimo = len(df[df['ano'] == anos_ord[-1]])
-        tendencia = ((ultimo - primeiro) / primeiro * 100) if primeiro > 0 else 0
-        tendencia_text = f"{tendencia:+.1f}%"
-        tendencia_color = "green" if tendencia < 0 else "red"
-    else:
-        tendencia_text = "N/A"
-        tendencia_color = "gray"
+@st.cache_data(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def build_cube(versao_dados, _df, _cubo=None):
+    """Cubo pré-agregado, calculado uma vez por versão dos dados (ou recebido pronto da ingestão)"""
+    if _cubo is not None:
+        return _cubo
+    return aggregate_cube(_df)
+
+@st.cache_data(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def dataset_key_hashes(versao_dados, _df, _hashes=None):
+    """Hashes ordenados das chaves de uma versão dos dados, para deduplicar acréscimos"""
+    if _hashes is not None:
+        return _hashes
+    return sorted_key_hashes(_df)
+
+def append_nc_data(fonte, df_base, versao_base, df_novo):
+    """Acrescenta à fonte só os registros inéditos do upload, atualizando snapshot e agregados"""
+    hashes_base = dataset_key_hashes(versao_base, df_base)
+    hashes_novo = record_key_hashes(df_novo)
+    ineditos = new_record_mask(hashes_base, hashes_novo)
+    novos = df_novo[ineditos]
+    if novos.empty:
+        return df_base, versao_base, 0
     
-    periodo_text = "Todos os Anos" if not anos_selecionados else f"Anos {', '.join(map(str, sorted(anos_selecionados)))}"
+    # A versão vem das partes gravadas até este acréscimo, não de uma nova listagem
+    partes = save_delta_snapshot(fonte, novos)
+    df = concat_nc_batches([df_base, novos])
+    versao_dados = source_version(fonte, len(partes))
     
-    col1, col2, col3, col4 = st.columns(4)
+    # Registra a nova versão e semeia seus caches a partir da anterior e do acréscimo
+    df = get_dataset_registry().put(versao_dados, df)
+    cubo = merge_cubes([build_cube(versao_base, df_base), aggregate_cube(novos)], df)
+    build_cube(versao_dados, df, cubo)
+    dataset_key_hashes(versao_dados, df, merge_key_hashes(hashes_base, hashes_novo[ineditos]))
+    return df, versao_dados, len(novos)
+
+def append_uploaded_data(fonte, uploaded_files, df_novo):
+    """Acrescenta o upload à fonte uma única vez, mesmo com os arquivos ainda no uploader"""
+    # Base lida, deduplicada e gravada sob a trava: acréscimos simultâneos não partem da mesma versão
+    with get_append_lock():
+        df_base, versao_base = load_source_data(fonte)
+        acrescimos = st.session_state.setdefault('_acrescimos', {})
+        chave = (upload_dataset_version(uploaded_files), versao_base)
+        if chave in acrescimos:
+            return df_base, versao_base, acrescimos[chave]
+        # Os acréscimos seguem o esquema da fonte: a planilha de origem só vale para o upload
+        df_novo = df_novo.drop(columns='origem', errors='ignore')
+        df, versao_dados, adicionados = append_nc_data(fonte, df_base, versao_base, df_novo)
+        acrescimos[(chave[0], versao_dados)] = adicionados
+        return df, versao_dados, adicionados
+
+@st.cache_resource(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def build_filter_index(versao_dados, _df):
+    """Índice invertido das dimensões de filtro, montado uma vez por versão dos dados"""
+    return kmais.build_filter_index(_df)
+
+@st.cache_resource(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def build_date_order(versao_dados, _df):
+    """Ordem das linhas por data (mais recentes primeiro), montada uma vez por versão dos dados"""
+    return kmais.build_date_order(_df)
+
+@st.cache_resource(max_entries=BROWSE_CACHE_MAX_ENTRIES)
+def browse_rows(versao_dados, estado_filtros, busca, _df, _linhas):
+    """Linhas filtradas e encontradas pela busca, na ordem por data, por (versão, filtros, busca)"""
+    ordem = build_date_order(versao_dados, _df)
+    return browse_order(ordem, len(_df), _linhas, search_mask(_df, busca))
+
+@section_fragment
+def create_recent_browser(versao_dados, df, linhas, selecoes):
+    """Navegador paginado e pesquisável das NCs; só a página visível é formatada e enviada"""
+    col_busca, col_tamanho, col_pagina = st.columns([3, 1, 1])
+    
+    with col_busca:
+        busca = st.text_input("🔎 Buscar", key='recentes_busca', placeholder="Cliente, categoria, tipo ou status")
+    with col_tamanho:
+        tamanho = st.selectbox("Registros por página", RECENT_PAGE_SIZES, key='recentes_tamanho')
+    
+    estado = filter_state_key(selecoes)
+    busca = ' '.join(busca.split()).casefold()
+    ordem = browse_rows(versao_dados, estado, busca, df, linhas)
+    
+    # Filtros, busca ou tamanho de página novos voltam para a primeira página
+    contexto = (versao_dados, estado, busca, tamanho)
+    if st.session_state.get('_recentes_contexto') != contexto:
+        st.session_state['_recentes_contexto'] = contexto
+        st.session_state['recentes_pagina'] = 1
+    
+    paginas = page_count(len(ordem), tamanho)
+    with col_pagina:
+        pagina = st.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, step=1, key='recentes_pagina')
+    
+    if len(ordem) == 0:
+        st.info("Nenhum dado disponível")
+        return 0
+    
+    linhas_pagina = page_rows(ordem, pagina, tamanho)
+    st.dataframe(format_records(df, linhas_pagina), use_container_width=True, hide_index=True)
+    inicio = (pagina - 1) * tamanho
+    st.caption(f"Mostrando {inicio + 1}–{inicio + len(linhas_pagina)} de {len(ordem)} registros")
+    return len(linhas_pagina)
+
+def create_kpi_cards(kpis, selecoes):
+    """Cria cards de KPIs (mesmo HTML dos relatórios estáticos)"""
+    for coluna, card in zip(st.columns(4), kpi_cards_html(None, selecoes, kpis)):
+        with coluna:
+            st.markdown(card, unsafe_allow_html=True)
+
+@st.cache_resource(max_entries=FIGURE_CACHE_MAX_ENTRIES)
+def chart_figure(versao_dados, estado_filtros, grafico, _dados, opcoes=None):
+    """Figura Plotly memoizada por (versão dos dados, estado dos filtros, gráfico, opções)"""
+    return CHART_BUILDERS[grafico](_dados, **(opcoes or {}))
+
+@st.cache_resource(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def build_database(versao_dados, _df):
+    """Base SQLite da versão dos dados (reaproveitada do disco se já existir); apaga as de versões fora do registro"""
+    banco = kmais.build_database(_df, versao_dados)
+    kmais.prune_databases([*get_dataset_registry().versions(), versao_dados])
+    return banco
+
+def open_database(versao_dados, df):
+    """Caminho da base da versão, recriando-a se o arquivo em cache foi apagado enquanto a versão estava fora de uso"""
+    banco = build_database(versao_dados, df)
+    if not banco.exists():
+        build_database.clear()
+        banco = build_database(versao_dados, df)
+    return banco
+
+@st.cache_resource(max_entries=FIGURE_CACHE_MAX_ENTRIES)
+def dashboard_aggregates(versao_dados, estado_filtros, _cubo, _selecoes, _banco=None):
+    """KPIs, evolução anual e rankings por (versão dos dados, filtros): pelo cubo ou em SQL na base SQLite"""
+    cubo, selecoes, banco = _cubo, _selecoes, _banco
+    if banco is not None:
+        return {
+            'kpis': sql_kpi_summary(banco, selecoes),
+            'evolucao': sql_annual_evolution(banco, selecoes),
+            'clientes': sql_rollup(banco, selecoes, 'cliente', top=10),
+            'categorias': sql_rollup(banco, selecoes, 'categoria'),
+            'tipos': sql_rollup(banco, selecoes, 'tipo', top=10)
+        }
+    cubo_filtrado = slice_cube(cubo, selecoes)
+    return {
+        'kpis': kpi_summary(cubo, selecoes),
+        'evolucao': annual_evolution(cubo, selecoes),
+        'clientes': rollup_cube(cubo_filtrado, 'cliente', top=10),
+        'categorias': rollup_cube(cubo_filtrado, 'categoria'),
+        'tipos': rollup_cube(cubo_filtrado, 'tipo', top=10)
+    }
+
+@st.cache_data(max_entries=QUERY_CACHE_MAX_ENTRIES)
+def run_sql_query(versao_dados, consulta, _banco):
+    """Resultado de uma consulta livre, memoizado por (versão dos dados, consulta)"""
+    return kmais.run_query(_banco, consulta)
+
+@section_fragment
+def render_query_box(versao_dados, banco):
+    """Consulta SQL livre (somente leitura) sobre a tabela ncs"""
+    with st.expander("🧮 Consulta SQL"):
+        with st.form('form_consulta_sql'):
+            st.text_area(
+                "Consulta (somente leitura)",
+                key='consulta_sql',
+                placeholder="SELECT cliente, COUNT(*) AS ncs FROM ncs WHERE ano = 2025 GROUP BY cliente ORDER BY ncs DESC",
+                help="Tabela ncs: data (AAAA-MM-DD), ano, cliente, categoria, tipo, status, volume_impactado"
+            )
+            st.form_submit_button("Executar", use_container_width=True)
+        
+        consulta = st.session_state.get('consulta_sql', '').strip()
+        if not consulta:
+            return
+        try:
+            resultado = run_sql_query(versao_dados, consulta, banco)
+        except (ValueError, sqlite3.Error) as e:
+            st.error(f"Erro na consulta: {e}")
+            return
+        st.dataframe(resultado, use_container_width=True, hide_index=True)
+        if len(resultado) == QUERY_MAX_ROWS:
+            st.caption(f"Mostrando as primeiras {QUERY_MAX_ROWS} linhas")
+
+@st.cache_resource(max_entries=EXPORT_CACHE_MAX_ENTRIES)
+def export_file(versao_dados, estado_filtros, conjunto, formato, _df, _linhas, _cubo, _selecoes):
+    """Arquivo exportado, gerado uma vez por (versão dos dados, filtros, conjunto, formato) e compartilhado entre sessões"""
+    if conjunto == 'registros':
+        blocos = iter_record_chunks(_df, _linhas)
+    else:
+        blocos = [ranking_table(_cubo, _selecoes, conjunto)]
+    return export_bytes(blocos, formato)
+
+@section_fragment
+def create_export_panel(versao_dados, df, linhas, cubo, selecoes):
+    """Exportação dos registros filtrados ou dos rankings; o arquivo só é gerado ao pedir"""
+    rotulos_formato = {EXPORT_FORMATS[formato]['rotulo']: formato for formato in EXPORT_FORMATS}
+    with st.expander("⬇️ Exportar dados"):
+        conjunto = EXPORT_DATASETS[st.selectbox("Conjunto", list(EXPORT_DATASETS), key='exportar_conjunto')]
+        formato = rotulos_formato[st.selectbox("Formato", list(rotulos_formato), key='exportar_formato')]
+        
+        # download_button precisa do conteúdo pronto: gerar a cada rerun custaria a exportação inteira
+        pedido = (versao_dados, filter_state_key(selecoes), conjunto, formato)
+        if st.button("Preparar arquivo", use_container_width=True):
+            st.session_state['_exportacao'] = pedido
+        if st.session_state.get('_exportacao') != pedido:
+            return
+        
+        try:
+            conteudo = export_file(*pedido, df, linhas, cubo, selecoes)
+        except ValueError as e:
+            st.warning(str(e))
+            return
+        st.download_button(
+            "Baixar arquivo",
+            conteudo,
+            file_name=f"ncs_{conjunto}.{EXPORT_FORMATS[formato]['extensao']}",
+            mime=EXPORT_FORMATS[formato]['mime'],
+            use_container_width=True
+        )
+        st.caption(f"{len(conteudo) / 1024:.0f} KB")
+
+@st.cache_resource(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def dataset_summary(versao_dados, _df):
+    """Período, registros por planilha de origem e volume total, calculados uma vez por versão dos dados"""
+    return {
+        'periodo': (_df['data'].min(), _df['data'].max()),
+        'origens': _df['origem'].value_counts(sort=False).to_dict() if 'origem' in _df.columns else {},
+        'volume': _df['volume_impactado'].sum()
+    }
+
+@st.cache_resource(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def detect_anomalies(versao_dados, _df):
+    """Recorrências e NCs sinalizadas no histórico inteiro, detectadas uma vez por versão dos dados"""
+    return kmais.detect_anomalies(_df)
+
+def create_anomalies(versao_dados, df, selecoes):
+    """Recorrências por cliente e tipo e NCs sinalizadas (recorrência, status repetido, volume atípico)"""
+    deteccao = slice_anomalies(detect_anomalies(versao_dados, df), selecoes)
+    ocorrencias = deteccao['ocorrencias']
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric(f"Repetições em até {RECURRENCE_WINDOW_DAYS} dias", int(ocorrencias['recorrencia'].sum()))
+    col2.metric("Status repetidos", int(ocorrencias['status_repetido'].sum()))
+    col3.metric("Volumes atípicos", int(ocorrencias['volume_atipico'].sum()))
     
+    col1, col2 = st.columns(2)
     with col1:
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-title">Total de NCs</div>
-            <div class="kpi-value">{total_ncs}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        st.subheader("🔁 Recorrências por Cliente e Tipo")
+        if deteccao['recorrencias'].empty:
+            st.info("Nenhuma recorrência encontrada")
+        else:
+            st.dataframe(
+                format_recurrences(deteccao['recorrencias'].head(ANOMALY_TABLE_ROWS)),
+                use_container_width=True,
+                hide_index=True
+            )
+            st.caption("Histórico completo (filtros de cliente e tipo aplicados)")
+    with col2:
+        st.subheader("🚩 NCs Sinalizadas")
+        if ocorrencias.empty:
+            st.info("Nenhuma NC sinalizada")
+        else:
+            st.dataframe(format_anomalies(ocorrencias.head(ANOMALY_TABLE_ROWS)), use_container_width=True, hide_index=True)
+            st.caption(f"Mostrando {min(len(ocorrencias), ANOMALY_TABLE_ROWS)} de {len(ocorrencias)} (mais recentes primeiro)")
+    return len(ocorrencias)
+
+def _select_years(anos):
+    """Seleção rápida de anos: ajusta o multiselect antes do rerun, sem um st.rerun() extra"""
+    st.session_state['anos_selecionados'] = anos
+
+def _keep_available(chave, opcoes):
+    """Descarta da escolha guardada no session_state valores ausentes da versão atual dos dados"""
+    valor = st.session_state.get(chave)
+    if isinstance(valor, list):
+        st.session_state[chave] = [item for item in valor if item in opcoes]
+    elif valor is not None and valor not in opcoes:
+        del st.session_state[chave]
+
+def _drill_into(cliente, tipo):
+    """Célula do mapa de calor escolhida: filtra o dashboard inteiro pelo cliente e pelo tipo"""
+    st.session_state['clientes_selecionados'] = [cliente]
+    st.session_state['tipos_selecionados'] = [tipo]
+    st.session_state['drill_cliente'] = cliente
+
+def _drill_from_chart():
+    """Clique numa célula do mapa de calor (Streamlit com on_select)"""
+    pontos = st.session_state['drill_mapa'].selection.points
+    if pontos:
+        _drill_into(pontos[0]['y'], pontos[0]['x'])
+
+def create_drilldown(versao_dados, df, selecoes):
+    """Mapa de calor cliente × tipo sobre o cubo mensal; um cliente detalha tipo × mês"""
+    cubo_mensal = build_time_cubes(versao_dados, df)['mensal']
+    metrica = SERIES_METRICS[st.radio("Métrica", list(SERIES_METRICS), horizontal=True, key='drill_metrica')]
+    
+    matriz = drill_matrix(cubo_mensal, selecoes, metrica)
+    if matriz.empty:
+        st.info("Nenhum dado disponível")
+        return 0
+    
+    # A matriz só depende de ano e categoria (cliente e tipo continuam navegáveis)
+    estado_mapa = filter_state_key({dimensao: selecoes.get(dimensao) for dimensao in ('ano', 'categoria')})
+    figura = chart_figure(versao_dados, estado_mapa, 'mapa_calor', matriz, {'metrica': metrica})
+    if PLOTLY_SELECTION:
+        st.plotly_chart(
+            figura,
+            use_container_width=True,
+            key='drill_mapa',
+            on_select=_drill_from_chart,
+            selection_mode='points'
+        )
+    else:
+        st.plotly_chart(figura, use_container_width=True)
     
+    col1, col2, col3 = st.columns([2, 2, 1])
+    clientes = list(matriz.index)
+    _keep_available('drill_cliente', clientes)
+    with col1:
+        cliente = st.selectbox("Cliente", clientes, key='drill_cliente')
+    tipos = list(matriz.columns[matriz.loc[cliente].notna()])
+    _keep_available('drill_tipo', tipos)
     with col2:
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-title">Período</div>
-            <div class="kpi-value" style="font-size: 1.5rem;">{periodo_text}</div>
-        </div>
-        """, unsafe_allow_html=True)
+        tipo = st.selectbox("Tipo", tipos, key='drill_tipo')
+    with col3:
+        # Cliente sem tipo na matriz: o selectbox fica vazio (None) e não há o que filtrar
+        st.button(
+            "🔎 Filtrar dashboard",
+            on_click=_drill_into,
+            args=(cliente, tipo),
+            disabled=tipo is None,
+            use_container_width=True,
+            help="Aplica o cliente e o tipo escolhidos aos filtros do sidebar"
+        )
+    
+    historico = drill_history(cubo_mensal, selecoes, cliente, metrica)
+    opcoes = {'metrica': metrica, 'cliente': cliente}
+    st.plotly_chart(chart_figure(versao_dados, estado_mapa, 'mapa_calor_mensal', historico, opcoes), use_container_width=True)
+    return int(matriz.notna().to_numpy().sum())
+
+@st.cache_resource(max_entries=CUBE_CACHE_MAX_ENTRIES)
+def build_time_cubes(versao_dados, _df):
+    """Cubos mensal e semanal por (período, cliente, categoria), montados uma vez por versão dos dados"""
+    return {granularidade: kmais.build_time_cube(_df, granularidade) for granularidade in GRANULARITIES}
+
+@section_fragment
+def create_time_series(versao_dados, df, selecoes):
+    """Série temporal com granularidade, métrica e janela móvel escolhidas, sem reagrupar as linhas"""
+    col1, col2, col3 = st.columns(3)
     
+    with col1:
+        granularidade = SERIES_GRANULARITIES[st.radio(
+            "Granularidade",
+            list(SERIES_GRANULARITIES),
+            horizontal=True,
+            key='serie_granularidade'
+        )]
+    with col2:
+        metrica = SERIES_METRICS[st.selectbox("Métrica", list(SERIES_METRICS), key='serie_metrica')]
     with col3:
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-title">Volume Impactado</div>
-            <div class="kpi-value">{volume_total/1000:.1f}</div>
-            <div class="kpi-subtitle">toneladas</div>
-        </div>
-        """, unsafe_allow_html=True)
+        janela = st.selectbox(
+            f"Janela móvel ({GRANULARITIES[granularidade]['plural']})",
+            ROLLING_WINDOWS[granularidade],
+            key=f'serie_janela_{granularidade}'
+        )
     
-    with col4:
-        st.markdown(f"""
-        <div class="kpi-card">
-            <div class="kpi-title">Tendência</div>
-            <div class="kpi-value" style="color: {tendencia_color};">{tendencia_text}</div>
-        </div>
-        """, unsafe_allow_html=True)
-
-def create_charts(df, anos_selecionados):
+    serie = time_series(build_time_cubes(versao_dados, df)[granularidade], selecoes, granularidade, janela)
+    if serie.empty or serie[metrica].sum() == 0:
+        st.info("Nenhum dado disponível")
+        return 0
+    
+    opcoes = {'metrica': metrica, 'granularidade': granularidade, 'janela': janela}
+    figura = chart_figure(versao_dados, filter_state_key(selecoes), 'serie_temporal', serie, opcoes)
+    st.plotly_chart(figura, use_container_width=True)
+    
+    # Último período da seleção: valor, acumulado na janela e variação anual
+    ultimo = serie.iloc[-1]
+    periodo = GRANULARITIES[granularidade]
+    formato = '{:.0f}'.format
+    col1, col2, col3 = st.columns(3)
+    col1.metric(
+        f"{periodo['ultimo']} ({ultimo['periodo'].strftime('%d/%m/%Y')})",
+        formato(ultimo[metrica]),
+        delta=f"{ultimo[metrica] - serie[metrica].iloc[-2]:+.0f}" if len(serie) > 1 else None,
+        delta_color='inverse'
+    )
+    col2.metric(f"Acumulado em {janela} {periodo['plural']}", formato(ultimo[f'{metrica}_acumulado']))
+    variacao = ultimo[f'{metrica}_yoy_pct']
+    col3.metric(
+        "Mesmo período do ano anterior",
+        formato(ultimo[metrica] - ultimo[f'{metrica}_yoy']) if pd.notna(ultimo[f'{metrica}_yoy']) else "N/A",
+        delta=f"{variacao:+.1f}%" if pd.notna(variacao) else None,
+        delta_color='inverse'
+    )
+    return len(serie)
+
+def create_charts(versao_dados, agregados, selecoes):
     """Cria gráficos interativos"""
-    if anos_selecionados:
-        df_filtrado = df[df['ano'].isin(anos_selecionados)]
-    else:
-        df_filtrado = df
-    
-    # Evolução anual
-    evolucao = df.groupby('ano').agg({
-        'data': 'count',
-        'volume_impactado': 'sum'
-    }).rename(columns={'data': 'ncs'}).reset_index()
-    
-    # Principais clientes
-    clientes = df_filtrado.groupby('cliente').agg({
-        'data': 'count',
-        'volume_impactado': 'sum'
-    }).rename(columns={'data': 'ncs'}).sort_values('ncs', ascending=False).head(10)
-    
-    # Categorias
-    categorias = df_filtrado.groupby('categoria').agg({
-        'data': 'count',
-        'volume_impactado': 'sum'
-    }).rename(columns={'data': 'ncs'}).sort_values('ncs', ascending=False)
+    estado = filter_state_key(selecoes)
+    # A evolução anual não depende do filtro de ano
+    estado_evolucao = filter_state_key(selecoes, ignorar='ano')
+    evolucao = agregados['evolucao']
+    clientes = agregados['clientes']
+    categorias = agregados['categorias']
     
     col1, col2 = st.columns(2)
     
     with col1:
         st.subheader("📈 Evolução Anual")
         if not evolucao.empty:
-            fig1 = px.bar(
-                evolucao, 
-                x='ano', 
-                y='ncs',
-                title="Número de NCs por Ano",
-                color_discrete_sequence=['#E30613'],
-                text='ncs'
-            )
-            fig1.update_layout(
-                height=400,
-                showlegend=False,
-                xaxis_title="Ano",
-                yaxis_title="Número de NCs"
-            )
-            fig1.update_traces(textposition='outside')
+            fig1 = chart_figure(versao_dados, estado_evolucao, 'evolucao_ncs', evolucao)
             st.plotly_chart(fig1, use_container_width=True)
         else:
             st.info("Nenhum dado disponível")
@@ -355,20 +733,7 @@ def create_charts(df, anos_selecionados):
     with col2:
         st.subheader("📊 Volume Impactado por Ano")
         if not evolucao.empty:
-            fig2 = px.line(
-                evolucao,
-                x='ano',
-                y='volume_impactado',
-                title="Volume Impactado (kg) por Ano",
-                markers=True,
-                color_discrete_sequence=['#E30613']
-            )
-            fig2.update_layout(
-                height=400,
-                showlegend=False,
-                xaxis_title="Ano",
-                yaxis_title="Volume Impactado (kg)"
-            )
+            fig2 = chart_figure(versao_dados, estado_evolucao, 'evolucao_volume', evolucao)
             st.plotly_chart(fig2, use_container_width=True)
         else:
             st.info("Nenhum dado disponível")
@@ -378,22 +743,7 @@ def create_charts(df, anos_selecionados):
     with col3:
         st.subheader("👥 Top 10 Clientes")
         if not clientes.empty:
-            fig3 = px.bar(
-                clientes.reset_index(),
-                x='ncs',
-                y='cliente',
-                orientation='h',
-                title="Principais Clientes por Número de NCs",
-                color_discrete_sequence=['#E30613'],
-                text='ncs'
-            )
-            fig3.update_layout(
-                height=400,
-                showlegend=False,
-                xaxis_title="Número de NCs",
-                yaxis_title="Cliente"
-            )
-            fig3.update_traces(textposition='outside')
+            fig3 = chart_figure(versao_dados, estado, 'top_clientes', clientes)
             st.plotly_chart(fig3, use_container_width=True)
         else:
             st.info("Nenhum dado de cliente disponível")
@@ -401,21 +751,100 @@ def create_charts(df, anos_selecionados):
     with col4:
         st.subheader("🏷️ Categorias de NC")
         if not categorias.empty:
-            fig4 = px.pie(
-                categorias.reset_index(),
-                values='ncs',
-                names='categoria',
-                title="Distribuição por Categoria",
-                color_discrete_sequence=['#E30613', '#17a2b8', '#ffc107', '#28a745']
-            )
-            fig4.update_layout(height=400)
-            fig4.update_traces(textposition='inside', textinfo='percent+label')
+            fig4 = chart_figure(versao_dados, estado, 'categorias', categorias)
             st.plotly_chart(fig4, use_container_width=True)
         else:
             st.info("Nenhum dado de categoria disponível")
 
+def _rss_bytes():
+    """Memória residente do processo em bytes (None fora do Linux)"""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+@contextmanager
+def measure_stage(perfil, nome, linhas=None):
+    """Mede tempo de parede, linhas processadas e variação de memória de uma etapa do rerun"""
+    etapa = {'etapa': nome, 'linhas': linhas}
+    memoria_antes = _rss_bytes()
+    inicio = time.perf_counter()
+    try:
+        yield etapa
+    finally:
+        etapa['tempo_ms'] = round((time.perf_counter() - inicio) * 1000, 2)
+        memoria_depois = _rss_bytes()
+        if memoria_antes is not None and memoria_depois is not None:
+            etapa['memoria_delta_mb'] = round((memoria_depois - memoria_antes) / 1024**2, 2)
+        else:
+            etapa['memoria_delta_mb'] = None
+        perfil.append(etapa)
+
+@st.cache_resource
+def get_perf_logger():
+    """Logger de desempenho: stderr (vai para o streamlit.log) ou o arquivo de KMAIS_PERF_LOG"""
+    logger = logging.getLogger(PERF_LOGGER_NAME)
+    if not logger.handlers:
+        handler = logging.FileHandler(PERF_LOG_PATH, encoding='utf-8') if PERF_LOG_PATH else logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+def log_rerun_profile(perfil, versao_dados):
+    """Grava o perfil do rerun como uma linha JSON e guarda o histórico da sessão"""
+    registro = {
+        'ts': datetime.now().isoformat(timespec='seconds'),
+        'sessao': _session_id(),
+        'versao_dados': versao_dados,
+        'total_ms': round(sum(etapa['tempo_ms'] for etapa in perfil), 2),
+        'etapas': perfil
+    }
+    get_perf_logger().info(json.dumps(registro, ensure_ascii=False, default=str))
+    
+    historico = st.session_state.setdefault('_perfil_historico', deque(maxlen=PERF_HISTORY_SIZE))
+    historico.append(registro)
+    return registro
+
+def admin_mode():
+    """Painel de desempenho habilitado por ?admin=1 na URL ou KMAIS_ADMIN=1"""
+    if os.environ.get('KMAIS_ADMIN') == '1':
+        return True
+    return st.experimental_get_query_params().get('admin', ['0'])[0] == '1'
+
+def render_profile_panel(perfil):
+    """Painel admin na barra lateral com as etapas do último rerun e o histórico recente"""
+    with st.sidebar.expander("⏱️ Desempenho do rerun"):
+        etapas = pd.DataFrame(perfil, columns=['etapa', 'tempo_ms', 'linhas', 'memoria_delta_mb'])
+        st.write(f"**Total:** {etapas['tempo_ms'].sum():.1f} ms")
+        st.dataframe(
+            etapas.rename(columns={
+                'etapa': 'Etapa',
+                'tempo_ms': 'Tempo (ms)',
+                'linhas': 'Linhas',
+                'memoria_delta_mb': 'Δ Memória (MB)'
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        historico = st.session_state.get('_perfil_historico', [])
+        if len(historico) > 1:
+            st.caption("Reruns recentes (ms por etapa)")
+            st.dataframe(
+                pd.DataFrame([
+                    {'hora': registro['ts'][11:], **{etapa['etapa']: etapa['tempo_ms'] for etapa in registro['etapas']}}
+                    for registro in reversed(historico)
+                ]),
+                use_container_width=True,
+                hide_index=True
+            )
+
 def main():
     """Função principal da aplicação"""
+    perfil = []
     
     # Header
     st.markdown("""
@@ -432,30 +861,57 @@ def main():
     <div class="upload-section">
         <h4>💡 Como Funciona</h4>
         <p>• <strong>Dados padrão:</strong> NCKmais22-25.xlsx carregada</p>
-        <p>• <strong>Upload:</strong> Substitui os dados atuais</p>
+        <p>• <strong>Upload:</strong> Substitui ou acrescenta aos dados atuais</p>
         <p>• <strong>JFA unificado:</strong> JFA e JFA-LSDH são o mesmo cliente</p>
         <p>• <strong>Tipos unificados:</strong> "Tambor fermentado" padronizado</p>
         <p>• <strong>100% Português:</strong> Todos os dados traduzidos</p>
     </div>
     """, unsafe_allow_html=True)
     
-    uploaded_file = st.sidebar.file_uploader(
-        "📤 Envie nova planilha para atualizar",
+    fontes = [FONTE_PADRAO] + [planilha.name for planilha in list_workbooks()]
+    fonte = st.sidebar.selectbox(
+        "📂 Fonte de dados:",
+        fontes,
+        help="Planilhas de data/ são convertidas uma vez em snapshot colunar"
+    )
+    
+    uploaded_files = st.sidebar.file_uploader(
+        "📤 Envie novas planilhas para atualizar",
         type=['xlsx', 'xls'],
-        help="Substitui os dados atuais pela nova planilha"
+        accept_multiple_files=True,
+        help="Várias planilhas (ex.: uma por unidade) são lidas em paralelo e consolidadas; "
+             "registros repetidos entre elas entram uma vez só"
+    )
+    
+    modo_upload = st.sidebar.radio(
+        "Modo do upload:",
+        [MODO_SUBSTITUIR, MODO_ACRESCENTAR],
+        help="Acrescentar grava só os registros inéditos (data + cliente + status + tipo) na fonte selecionada"
     )
     
     # Carregar dados
-    if uploaded_file is not None:
-        df = process_uploaded_data(uploaded_file)
-        if df is not None:
-            st.sidebar.success(f"✅ Dados atualizados: {len(df)} registros")
+    with measure_stage(perfil, 'carregamento') as etapa:
+        if uploaded_files:
+            df = process_uploaded_data(uploaded_files, fonte)
+            if df is not None and modo_upload == MODO_ACRESCENTAR:
+                df, versao_dados, adicionados = append_uploaded_data(fonte, uploaded_files, df)
+                st.sidebar.success(f"✅ {adicionados} registros novos acrescentados ({len(df)} no total)")
+            elif df is not None:
+                versao_dados = upload_dataset_version(uploaded_files)
+                st.sidebar.success(f"✅ Dados atualizados: {len(df)} registros de {len(uploaded_files)} planilha(s)")
+            else:
+                df, versao_dados = load_source_data(fonte)
+                st.sidebar.warning("⚠️ Erro no upload, mantendo dados da fonte selecionada")
         else:
-            df = load_real_data()
-            st.sidebar.warning("⚠️ Erro no upload, mantendo dados padrão")
-    else:
-        df = load_real_data()
-        st.sidebar.info("📊 Usando dados padrão da NCKmais22-25.xlsx")
+            df, versao_dados = load_source_data(fonte)
+            if fonte == FONTE_PADRAO:
+                st.sidebar.info("📊 Usando dados padrão da NCKmais22-25.xlsx")
+            else:
+                st.sidebar.info(f"📊 Usando snapshot de {fonte}")
+        etapa['linhas'] = len(df)
+    
+    # A sessão guarda só a versão; o df fica no registro compartilhado
+    get_dataset_registry().acquire(_session_id(), versao_dados)
     
     if df.empty:
         st.error("Nenhum dado disponível")
@@ -464,121 +920,184 @@ def main():
     # Filtros
     st.sidebar.header("🔍 Filtros")
     
-    anos_disponiveis = sorted(df['ano'].unique())
+    indice = build_filter_index(versao_dados, df)
+    anos_disponiveis = filter_options(indice, 'ano')
+    # Todos os anos na primeira visita; valores ausentes da versão atual dos dados são descartados
+    st.session_state.setdefault('anos_selecionados', list(anos_disponiveis))
+    opcoes_filtro = {dimensao: filter_options(indice, dimensao) for dimensao in ('cliente', 'categoria', 'tipo')}
+    _keep_available('anos_selecionados', anos_disponiveis)
+    _keep_available('clientes_selecionados', opcoes_filtro['cliente'])
+    _keep_available('categorias_selecionadas', opcoes_filtro['categoria'])
+    _keep_available('tipos_selecionados', opcoes_filtro['tipo'])
     anos_selecionados = st.sidebar.multiselect(
         "Selecione os anos:",
         anos_disponiveis,
-        default=anos_disponiveis,
+        key='anos_selecionados',
         help="Selecione um ou mais anos para análise"
     )
     
     # Botões de seleção rápida
     col_a, col_b = st.sidebar.columns(2)
-    with col_a:
-        if st.button("2024 + 2025", use_container_width=True):
-            st.session_state.anos_selecionados = [2024, 2025]
-            st.rerun()
-    with col_b:
-        if st.button("2022 + 2023", use_container_width=True):
-            st.session_state.anos_selecionados = [2022, 2023]
-            st.rerun()
-    
-    # Usar session state se disponível
-    if 'anos_selecionados' in st.session_state:
-        anos_selecionados = st.session_state.anos_selecionados
-    
-    # Aplicar filtros
-    df_filtrado = df.copy()
-    if anos_selecionados:
-        df_filtrado = df_filtrado[df_filtrado['ano'].isin(anos_selecionados)]
+    for coluna, anos in ((col_a, [2024, 2025]), (col_b, [2022, 2023])):
+        with coluna:
+            st.button(
+                " + ".join(map(str, anos)),
+                on_click=_select_years,
+                args=([ano for ano in anos if ano in anos_disponiveis],),
+                use_container_width=True
+            )
+    
+    clientes_selecionados = st.sidebar.multiselect(
+        "Clientes:",
+        opcoes_filtro['cliente'],
+        key='clientes_selecionados',
+        help="Vazio = todos os clientes"
+    )
+    categorias_selecionadas = st.sidebar.multiselect(
+        "Categorias:",
+        opcoes_filtro['categoria'],
+        key='categorias_selecionadas',
+        help="Vazio = todas as categorias"
+    )
+    tipos_selecionados = st.sidebar.multiselect(
+        "Tipos:",
+        opcoes_filtro['tipo'],
+        key='tipos_selecionados',
+        help="Vazio = todos os tipos (uma célula do drill-down preenche cliente e tipo)"
+    )
+    
+    # Aplicar filtros: visão filtrada calculada uma vez e compartilhada pelas seções
+    selecoes = {
+        'ano': list(anos_selecionados),
+        'cliente': clientes_selecionados,
+        'categoria': categorias_selecionadas,
+        'tipo': tipos_selecionados
+    }
+    with measure_stage(perfil, 'filtros', len(df)):
+        linhas = filter_rows(indice, selecoes)
+        total_linhas_filtradas = len(df) if linhas is None else len(linhas)
+    estado = filter_state_key(selecoes)
+    
+    secoes = st.sidebar.multiselect(
+        "🧩 Seções exibidas:",
+        PAGE_SECTIONS,
+        default=PAGE_SECTIONS,
+        key='secoes_visiveis',
+        help="Seções desmarcadas não são calculadas"
+    )
+    
+    # Agregações compartilhadas por KPIs, gráficos e tabelas, memoizadas por (versão, filtros)
+    with measure_stage(perfil, 'agregacao', len(df)):
+        cubo = build_cube(versao_dados, df)
+        banco = open_database(versao_dados, df) if SQL_BACKEND else None
+        agregados = dashboard_aggregates(versao_dados, estado, cubo, selecoes, banco)
+        total_filtrado = agregados['kpis']['total_ncs']
     
     # KPIs
-    create_kpi_cards(df, anos_selecionados)
+    if "KPIs" in secoes:
+        with measure_stage(perfil, 'kpis', total_filtrado):
+            create_kpi_cards(agregados['kpis'], selecoes)
     
     # Gráficos
-    st.header("📊 Análise Visual")
-    create_charts(df, anos_selecionados)
+    if "Análise Visual" in secoes:
+        st.header("📊 Análise Visual")
+        with measure_stage(perfil, 'graficos', total_filtrado):
+            create_charts(versao_dados, agregados, selecoes)
     
-    # Análise horizontal
-    st.header("📈 Análise Horizontal")
+    # Série temporal
+    if "Série Temporal" in secoes:
+        st.header("📅 Série Temporal")
+        with measure_stage(perfil, 'serie_temporal') as etapa:
+            etapa['linhas'] = create_time_series(versao_dados, df, selecoes)
     
-    col1, col2 = st.columns(2)
+    # Análise horizontal
+    if "Análise Horizontal" in secoes:
+        st.header("📈 Análise Horizontal")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            with measure_stage(perfil, 'tabela_clientes', total_filtrado):
+                st.subheader("👥 Principais Clientes")
+                if total_filtrado > 0:
+                    clientes_analise = agregados['clientes'].copy()
+                    
+                    clientes_analise['percentual'] = (clientes_analise['ncs'] / total_filtrado * 100).round(1)
+                    clientes_analise['volume_kg'] = clientes_analise['volume_impactado'].round(0)
+                    
+                    st.dataframe(
+                        clientes_analise[['ncs', 'percentual', 'volume_kg']].rename(columns={
+                            'ncs': 'NCs',
+                            'percentual': '% Total',
+                            'volume_kg': 'Volume (kg)'
+                        }),
+                        use_container_width=True
+                    )
+                else:
+                    st.info("Nenhum dado disponível")
+        
+        with col2:
+            with measure_stage(perfil, 'tabela_tipos', total_filtrado):
+                st.subheader("🔧 Principais Tipos")
+                if total_filtrado > 0:
+                    tipos_analise = agregados['tipos'].copy()
+                    
+                    tipos_analise['percentual'] = (tipos_analise['ncs'] / total_filtrado * 100).round(1)
+                    tipos_analise['volume_kg'] = tipos_analise['volume_impactado'].round(0)
+                    
+                    st.dataframe(
+                        tipos_analise[['ncs', 'percentual', 'volume_kg']].rename(columns={
+                            'ncs': 'NCs',
+                            'percentual': '% Total',
+                            'volume_kg': 'Volume (kg)'
+                        }),
+                        use_container_width=True
+                    )
+                else:
+                    st.info("Nenhum dado disponível")
     
-    with col1:
-        st.subheader("👥 Principais Clientes")
-        if not df_filtrado.empty:
-            clientes_analise = df_filtrado.groupby('cliente').agg({
-                'data': 'count',
-                'volume_impactado': 'sum'
-            }).rename(columns={'data': 'ncs'}).sort_values('ncs', ascending=False).head(10)
-            
-            clientes_analise['percentual'] = (clientes_analise['ncs'] / len(df_filtrado) * 100).round(1)
-            clientes_analise['volume_kg'] = clientes_analise['volume_impactado'].round(0)
-            
-            st.dataframe(
-                clientes_analise[['ncs', 'percentual', 'volume_kg']].rename(columns={
-                    'ncs': 'NCs',
-                    'percentual': '% Total',
-                    'volume_kg': 'Volume (kg)'
-                }),
-                use_container_width=True
-            )
-        else:
-            st.info("Nenhum dado disponível")
+    # Drill-down cliente × tipo × mês
+    if "Drill-down" in secoes:
+        st.header("🔥 Drill-down Cliente × Tipo")
+        with measure_stage(perfil, 'drill_down') as etapa:
+            etapa['linhas'] = create_drilldown(versao_dados, df, selecoes)
     
-    with col2:
-        st.subheader("🔧 Principais Tipos")
-        if not df_filtrado.empty:
-            tipos_analise = df_filtrado.groupby('tipo').agg({
-                'data': 'count',
-                'volume_impactado': 'sum'
-            }).rename(columns={'data': 'ncs'}).sort_values('ncs', ascending=False).head(10)
-            
-            tipos_analise['percentual'] = (tipos_analise['ncs'] / len(df_filtrado) * 100).round(1)
-            tipos_analise['volume_kg'] = tipos_analise['volume_impactado'].round(0)
-            
-            st.dataframe(
-                tipos_analise[['ncs', 'percentual', 'volume_kg']].rename(columns={
-                    'ncs': 'NCs',
-                    'percentual': '% Total',
-                    'volume_kg': 'Volume (kg)'
-                }),
-                use_container_width=True
-            )
-        else:
-            st.info("Nenhum dado disponível")
+    # Recorrências e anomalias
+    if "Anomalias" in secoes:
+        st.header("🚨 Recorrências e Anomalias")
+        with measure_stage(perfil, 'anomalias') as etapa:
+            etapa['linhas'] = create_anomalies(versao_dados, df, selecoes)
     
     # Tabela de dados recentes
-    st.header("📋 Não Conformidades Recentes")
-    
-    if not df_filtrado.empty:
-        df_recentes = df_filtrado.sort_values('data', ascending=False).head(20)
-        df_recentes = df_recentes.copy()
-        df_recentes['data_formatada'] = df_recentes['data'].dt.strftime('%d/%m/%Y')
+    if "Recentes" in secoes:
+        st.header("📋 Não Conformidades Recentes")
         
-        st.dataframe(
-            df_recentes[['data_formatada', 'cliente', 'categoria', 'tipo', 'volume_impactado', 'status']].rename(columns={
-                'data_formatada': 'Data',
-                'cliente': 'Cliente',
-                'categoria': 'Categoria',
-                'tipo': 'Tipo',
-                'volume_impactado': 'Volume (kg)',
-                'status': 'Status'
-            }),
-            use_container_width=True,
-            hide_index=True
-        )
-    else:
-        st.info("Nenhum dado disponível")
+        with measure_stage(perfil, 'tabela_recentes') as etapa:
+            etapa['linhas'] = create_recent_browser(versao_dados, df, linhas, selecoes)
     
     # Rodapé
     st.sidebar.markdown("---")
     st.sidebar.markdown("**📊 Estatísticas:**")
+    resumo = dataset_summary(versao_dados, df)
     st.sidebar.write(f"• Total: {len(df)} registros")
-    if not df.empty:
-        st.sidebar.write(f"• Período: {df['data'].min().strftime('%d/%m/%Y')} - {df['data'].max().strftime('%d/%m/%Y')}")
-    st.sidebar.write(f"• Filtrados: {len(df_filtrado)}")
-    st.sidebar.write(f"• Volume: {df['volume_impactado'].sum()/1000:.1f} ton")
+    for origem, quantidade in resumo['origens'].items():
+        st.sidebar.write(f"  ◦ {origem}: {quantidade} registros")
+    inicio, fim = resumo['periodo']
+    st.sidebar.write(f"• Período: {inicio.strftime('%d/%m/%Y')} - {fim.strftime('%d/%m/%Y')}")
+    st.sidebar.write(f"• Filtrados: {total_linhas_filtradas}")
+    st.sidebar.write(f"• Volume: {resumo['volume']/1000:.1f} ton")
+    registro = get_dataset_registry().stats()
+    st.sidebar.write(f"• Em memória: {registro['versoes']} versões, {registro['bytes']/1024**2:.1f} MB, {registro['sessoes']} sessões")
+    
+    with st.sidebar:
+        create_export_panel(versao_dados, df, linhas, cubo, selecoes)
+        if banco is not None:
+            render_query_box(versao_dados, banco)
+    
+    # Instrumentação do rerun
+    log_rerun_profile(perfil, versao_dados)
+    if admin_mode():
+        render_profile_panel(perfil)
 
 if __name__ == "__main__":
     main()
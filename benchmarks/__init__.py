@@ -0,0 +1 @@
+"""Benchmarks headless do pipeline de dados do dashboard."""
@@ -0,0 +1,233 @@
+"""Benchmark headless do pipeline do dashboard: ingestão, filtros, agregação e figuras.
+
+Uso (a partir da raiz do repositório):
+    python -m benchmarks.run_benchmarks
+    python -m benchmarks.run_benchmarks --tamanhos 1000 100000 --repeticoes 5
+    python -m benchmarks.run_benchmarks --comparar benchmarks/resultados/base.json
+
+Cada execução grava um JSON em benchmarks/resultados/ e compara com a
+execução anterior (ou com --comparar), apontando regressões de tempo e de
+pico de memória acima do limite.
+"""
+import argparse
+import datetime
+import gc
+import json
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+
+import kmais
+from benchmarks.synthetic_workbook import synthetic_workbook
+
+RESULTADOS_DIR = Path(__file__).parent / 'resultados'
+TAMANHOS_PADRAO = [1_000, 100_000, 1_000_000]
+
+# Variações absolutas abaixo destes valores não contam como regressão
+RUIDO_TEMPO_S = 0.002
+RUIDO_MEMORIA_MB = 0.5
+
+
+def measure(func, repeticoes, medir_memoria):
+    """Tempo (mínimo e mediana) e, numa passada separada, pico de memória via tracemalloc"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        func()
+        tempos.append(time.perf_counter() - inicio)
+    medida = {'tempo_min_s': min(tempos), 'tempo_mediana_s': statistics.median(tempos)}
+    if medir_memoria:
+        gc.collect()
+        tracemalloc.start()
+        func()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        medida['pico_mb'] = pico / 1024 ** 2
+    return medida
+
+
+def pipeline_stages(caminho, df, pasta_banco):
+    """Etapas medidas, na ordem em que o dashboard as executa"""
+    indice = kmais.build_filter_index(df)
+    cubo = kmais.aggregate_cube(df)
+    anos = sorted(kmais.filter_options(indice, 'ano'))[-2:]
+    clientes = list(kmais.rollup_cube(cubo, 'cliente', top=3).index)
+    selecoes = {'ano': anos, 'cliente': clientes, 'categoria': []}
+
+    def filtragem():
+        linhas = kmais.filter_rows(indice, selecoes)
+        return df if linhas is None else df.take(linhas)
+
+    def agregacoes():
+        # KPIs + tabelas da Análise Horizontal a partir do cubo
+        cubo_filtrado = kmais.slice_cube(cubo, selecoes)
+        total = int(cubo_filtrado['ncs'].sum())
+        for dimensao in ('cliente', 'tipo'):
+            tabela = kmais.rollup_cube(cubo_filtrado, dimensao, top=10)
+            tabela['percentual'] = (tabela['ncs'] / max(total, 1) * 100).round(1)
+        kmais.rollup_cube(cubo_filtrado, 'categoria')
+        kmais.kpi_summary(cubo, selecoes)
+
+    versao_banco = f"benchmark:{caminho.name}"
+    banco = kmais.build_database(df, versao_banco, pasta_banco)
+
+    def agregacoes_sql():
+        # Mesmos KPIs e tabelas, empurrados para a base SQLite (KMAIS_BACKEND=sqlite)
+        for dimensao, top in (('cliente', 10), ('tipo', 10), ('categoria', None)):
+            kmais.sql_rollup(banco, selecoes, dimensao, top=top)
+        kmais.sql_kpi_summary(banco, selecoes)
+
+    ordem = kmais.build_date_order(df)
+
+    def pagina_recentes():
+        # Navegador de registros: ordem por data já montada, página = fatia
+        linhas = kmais.filter_rows(indice, selecoes)
+        ordem_filtrada = kmais.browse_order(ordem, len(df), linhas, kmais.search_mask(df, 'cliente'))
+        return kmais.format_records(df, kmais.page_rows(ordem_filtrada, 2, 20))
+
+    cubos_temporais = {granularidade: kmais.build_time_cube(df, granularidade) for granularidade in kmais.GRANULARITIES}
+
+    def series_temporais():
+        # Troca de granularidade/janela: só o cubo temporal pré-calculado é reagrupado
+        for granularidade, janelas in kmais.ROLLING_WINDOWS.items():
+            kmais.time_series(cubos_temporais[granularidade], selecoes, granularidade, janelas[0])
+
+    def drill_down():
+        # Mapa cliente × tipo e detalhe tipo × mês do cliente com mais NCs, a partir do cubo mensal
+        matriz = kmais.drill_matrix(cubos_temporais['mensal'], selecoes)
+        return kmais.drill_history(cubos_temporais['mensal'], selecoes, matriz.index[0])
+
+    def exportacao():
+        # Registros filtrados em CSV compactado e Parquet, gravados em blocos
+        linhas = kmais.filter_rows(indice, selecoes)
+        for formato in ('csv.gz', 'parquet'):
+            kmais.export_bytes(kmais.iter_record_chunks(df, linhas), formato)
+
+    def figuras():
+        # Construção + serialização, como st.plotly_chart faz a cada render
+        cubo_filtrado = kmais.slice_cube(cubo, selecoes)
+        evolucao = kmais.annual_evolution(cubo, selecoes)
+        dados = {
+            'evolucao_ncs': evolucao,
+            'evolucao_volume': evolucao,
+            'top_clientes': kmais.rollup_cube(cubo_filtrado, 'cliente', top=10),
+            'categorias': kmais.rollup_cube(cubo_filtrado, 'categoria'),
+            'serie_temporal': kmais.time_series(cubos_temporais['mensal'], selecoes, 'mensal', 3),
+            'mapa_calor': kmais.drill_matrix(cubos_temporais['mensal'], selecoes),
+            'mapa_calor_mensal': drill_down()
+        }
+        for grafico, construir in kmais.CHART_BUILDERS.items():
+            construir(dados[grafico]).to_json()
+
+    return [
+        ('ingestao', lambda: kmais.ingest_workbook(str(caminho))),
+        ('ingestao_streaming', lambda: kmais.ingest_streaming(str(caminho))),
+        ('validacao', lambda: kmais.validate_workbook(str(caminho))),
+        ('indice_filtros', lambda: kmais.build_filter_index(df)),
+        ('filtragem', filtragem),
+        ('cubo', lambda: kmais.aggregate_cube(df)),
+        ('agregacoes', agregacoes),
+        ('base_sqlite', lambda: kmais.build_database(df, versao_banco, pasta_banco, reaproveitar=False)),
+        ('agregacoes_sql', agregacoes_sql),
+        ('ordem_por_data', lambda: kmais.build_date_order(df)),
+        ('pagina_recentes', pagina_recentes),
+        ('cubos_temporais', lambda: [kmais.build_time_cube(df, granularidade) for granularidade in kmais.GRANULARITIES]),
+        ('series_temporais', series_temporais),
+        ('drill_down', drill_down),
+        ('anomalias', lambda: kmais.detect_anomalies(df)),
+        ('exportacao', exportacao),
+        ('figuras', figuras),
+    ]
+
+
+def run(tamanhos, repeticoes, repeticoes_ingestao, medir_memoria):
+    """Executa todas as etapas para cada tamanho de planilha"""
+    resultados = {}
+    for linhas in tamanhos:
+        print(f"→ {linhas} linhas: preparando planilha sintética...", flush=True)
+        caminho = synthetic_workbook(linhas)
+        df, _ = kmais.ingest_workbook(str(caminho))
+        resultados[str(linhas)] = {}
+        # Bases SQLite do benchmark numa pasta temporária, fora de data/sqlite/ do dashboard
+        with tempfile.TemporaryDirectory(prefix='kmais-benchmark-') as pasta_banco:
+            for etapa, func in pipeline_stages(caminho, df, pasta_banco):
+                vezes = repeticoes_ingestao if etapa.startswith('ingestao') else repeticoes
+                medida = measure(func, vezes, medir_memoria)
+                medida['linhas'] = len(df)
+                resultados[str(linhas)][etapa] = medida
+                print(f"   {etapa:<20} {medida['tempo_min_s'] * 1000:>10.1f} ms"
+                      + (f"  {medida['pico_mb']:>8.1f} MB" if 'pico_mb' in medida else ''), flush=True)
+    return {
+        'data': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'resultados': resultados
+    }
+
+
+def compare_results(atual, anterior, limite):
+    """Relatório de regressão: variação de tempo mínimo e de pico de memória por etapa"""
+    linhas = []
+    regressoes = 0
+    for tamanho, etapas in atual['resultados'].items():
+        for etapa, medida in etapas.items():
+            referencia = anterior['resultados'].get(tamanho, {}).get(etapa)
+            if referencia is None:
+                continue
+            variacoes = []
+            significativas = []
+            for campo, ruido in (('tempo_min_s', RUIDO_TEMPO_S), ('pico_mb', RUIDO_MEMORIA_MB)):
+                if campo in medida and referencia.get(campo):
+                    variacao = (medida[campo] - referencia[campo]) / referencia[campo]
+                    variacoes.append(variacao)
+                    # Diferenças absolutas pequenas são ruído de medição, não regressão
+                    if abs(medida[campo] - referencia[campo]) > ruido:
+                        significativas.append(variacao)
+            status = 'ok'
+            if any(variacao > limite for variacao in significativas):
+                status = 'REGRESSÃO'
+                regressoes += 1
+            elif significativas and all(variacao < -limite for variacao in significativas):
+                status = 'melhora'
+            texto = '  '.join(f"{variacao:+7.1%}" for variacao in variacoes)
+            linhas.append(f"{tamanho:>9} {etapa:<20} {texto:<20} {status}")
+    print(f"\nComparação com {anterior['data']} (limite {limite:.0%}):")
+    print(f"{'linhas':>9} {'etapa':<20} {'Δ tempo  Δ memória':<20} status")
+    print('\n'.join(linhas) if linhas else "   nenhuma etapa em comum")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS_PADRAO)
+    parser.add_argument('--repeticoes', type=int, default=5)
+    parser.add_argument('--repeticoes-ingestao', type=int, default=1)
+    parser.add_argument('--sem-memoria', action='store_true', help="Não mede pico de memória (mais rápido)")
+    parser.add_argument('--comparar', type=Path, help="Resultado de referência (padrão: execução anterior)")
+    parser.add_argument('--limite', type=float, default=0.10, help="Variação considerada regressão (0.10 = 10%%)")
+    parser.add_argument('--falhar-em-regressao', action='store_true')
+    args = parser.parse_args(argv)
+
+    anteriores = sorted(RESULTADOS_DIR.glob('*.json'))
+    atual = run(args.tamanhos, args.repeticoes, args.repeticoes_ingestao, not args.sem_memoria)
+
+    RESULTADOS_DIR.mkdir(parents=True, exist_ok=True)
+    destino = RESULTADOS_DIR / f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    destino.write_text(json.dumps(atual, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\nResultados gravados em {destino}")
+
+    referencia = args.comparar or (anteriores[-1] if anteriores else None)
+    if referencia is None:
+        return 0
+    regressoes = compare_results(atual, json.loads(Path(referencia).read_text(encoding='utf-8')), args.limite)
+    return 1 if regressoes and args.falhar_em_regressao else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,76 @@
+"""Gera planilhas sintéticas de NC no formato documentado no README.
+
+Os valores misturam termos já em português com os termos em francês e as
+variantes ("Tambores fermentados + ...") que o motor de normalização unifica.
+"""
+import datetime
+from pathlib import Path
+
+import numpy as np
+import openpyxl
+
+DADOS_DIR = Path(__file__).parent / 'dados'
+
+CABECALHO = ['Data', 'Cliente', 'Categoria', 'Tipo', 'Volume Impactado', 'Status']
+
+CLIENTES = [
+    'Lassonde', 'Boiron', 'Authentifruits', 'JFA - LSDH', 'JFA', 'Antilles Glaces',
+    'Synertrading', 'Sumol', 'Rauch', 'Materne', 'Medibel'
+] + [f"Cliente {i:03d}" for i in range(1, 40)]
+
+CATEGORIAS = [
+    'Produto', 'Produit', 'Embalagem', 'Emballage',
+    'Documentação', 'Documentaire', 'Entrega', 'SupplyChain_Livraison'
+]
+
+TIPOS = [
+    'Tambor fermentado', 'Tambores fermentados', 'Tambores fermentados + Mofo',
+    'Tambores fermentados + presença de tambores enfermos', 'Endommagement', 'Dano',
+    'Réglementation', 'Hors spec', 'Organo', 'Mofo', 'Corpo estranho', 'Defeito',
+    'Paletização', 'Presença de partículas de polpa branca'
+]
+
+INICIO = datetime.date(2022, 1, 1)
+DIAS = (datetime.date(2025, 12, 31) - INICIO).days
+
+
+def generate_rows(linhas, semente=42):
+    """Gera as linhas da planilha de forma vetorizada e as entrega uma a uma"""
+    rng = np.random.default_rng(semente)
+    dias = rng.integers(0, DIAS, linhas)
+    clientes = rng.integers(0, len(CLIENTES), linhas)
+    categorias = rng.integers(0, len(CATEGORIAS), linhas)
+    tipos = rng.integers(0, len(TIPOS), linhas)
+    volumes = rng.integers(0, 9, linhas) * 205
+    codigos = rng.integers(1, 1000, linhas)
+    for i in range(linhas):
+        data = INICIO + datetime.timedelta(days=int(dias[i]))
+        status = f"{'GHJK'[data.year - 2022]}{codigos[i]:03d}"
+        yield (
+            datetime.datetime(data.year, data.month, data.day),
+            CLIENTES[clientes[i]],
+            CATEGORIAS[categorias[i]],
+            TIPOS[tipos[i]],
+            int(volumes[i]),
+            status
+        )
+
+
+def write_workbook(caminho, linhas, semente=42):
+    """Grava a planilha em modo write-only do openpyxl (memória constante)"""
+    workbook = openpyxl.Workbook(write_only=True)
+    planilha = workbook.create_sheet('NCs')
+    planilha.append(CABECALHO)
+    for linha in generate_rows(linhas, semente):
+        planilha.append(linha)
+    Path(caminho).parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(caminho)
+    return Path(caminho)
+
+
+def synthetic_workbook(linhas, diretorio=DADOS_DIR, semente=42):
+    """Caminho da planilha sintética com o número de linhas pedido, gerando-a se preciso"""
+    caminho = Path(diretorio) / f"nc_sintetico_{linhas}_s{semente}.xlsx"
+    if not caminho.exists():
+        write_workbook(caminho, linhas, semente)
+    return caminho
@@ -0,0 +1,119 @@
+"""Núcleo de análise das não conformidades KMAIS, sem dependência do Streamlit.
+
+Validação, ingestão, normalização, filtros e agregações usados pelo dashboard (app.py),
+pelos benchmarks e por jobs em lote, com uma base SQLite local opcional para
+as mesmas agregações em SQL e exportação em CSV, Parquet ou Excel. Plotly,
+openpyxl e pyarrow só são importados quando uma figura, planilha, snapshot ou
+exportação é de fato usada.
+"""
+from kmais.aggregate import (
+    aggregate_cube,
+    annual_evolution,
+    kpi_summary,
+    merge_cubes,
+    merge_key_hashes,
+    new_record_mask,
+    record_key_hashes,
+    rollup_cube,
+    slice_cube,
+    sorted_key_hashes,
+    summable_volume,
+)
+from kmais.anomalies import (
+    RECURRENCE_WINDOW_DAYS,
+    detect_anomalies,
+    format_anomalies,
+    format_recurrences,
+    occurrence_order,
+    slice_anomalies,
+    volume_limits,
+)
+from kmais.browse import (
+    RECORD_COLUMNS,
+    browse_order,
+    build_date_order,
+    format_records,
+    page_count,
+    page_rows,
+    search_mask,
+)
+from kmais.charts import CHART_BUILDERS
+from kmais.constants import (
+    CATEGORICAL_COLUMNS,
+    COLUMN_KEYWORDS,
+    CUBE_DIMENSIONS,
+    DATABASE_DIR,
+    DATA_DIR,
+    DEDUP_KEY,
+    FILTER_DIMENSIONS,
+    FONTE_PADRAO,
+    NORMALIZATION_RULES_PATH,
+    QUERY_MAX_ROWS,
+    QUERY_TIMEOUT_SECONDS,
+    REQUIRED_COLUMNS,
+    SNAPSHOT_DIR,
+    STREAMING_BATCH_ROWS,
+    STREAMING_THRESHOLD_BYTES,
+    VALIDATION_SAMPLE_ROWS,
+)
+from kmais.database import (
+    build_database,
+    database_path,
+    prune_databases,
+    run_query,
+    sql_annual_evolution,
+    sql_kpi_summary,
+    sql_rollup,
+)
+from kmais.drilldown import DRILL_TOP_CLIENTS, DRILL_TOP_TYPES, drill_history, drill_matrix
+from kmais.export import (
+    EXCEL_MAX_ROWS,
+    EXPORT_FORMATS,
+    export_bytes,
+    iter_record_chunks,
+    ranking_table,
+    write_export,
+)
+from kmais.filters import build_filter_index, filter_options, filter_rows, filter_state_key
+from kmais.ingest import (
+    clean_nc_data,
+    column_by_name,
+    compact_nc_data,
+    concat_nc_batches,
+    infer_date_format,
+    ingest_streaming,
+    ingest_workbook,
+    ingest_workbooks,
+    iter_workbook_batches,
+    load_default_data,
+    map_columns,
+    merge_sources,
+    use_streaming,
+)
+from kmais.normalize import load_normalization_rules, normalize_column, normalize_nc_data
+from kmais.registry import DatasetRegistry
+from kmais.snapshots import (
+    build_snapshot,
+    list_delta_snapshots,
+    list_workbooks,
+    load_snapshot,
+    load_source_frame,
+    load_workbook_data,
+    save_delta_snapshot,
+    snapshot_path,
+    source_version,
+)
+from kmais.timeseries import (
+    GRANULARITIES,
+    ROLLING_WINDOWS,
+    build_time_cube,
+    slice_time_cube,
+    time_series,
+)
+from kmais.validation import (
+    check_columns,
+    known_categories,
+    read_sample,
+    validate_sample,
+    validate_workbook,
+)
@@ -0,0 +1,105 @@
+"""Cubo pré-agregado, recortes e indicadores calculados a partir dele"""
+import numpy as np
+import pandas as pd
+
+from kmais.constants import CUBE_DIMENSIONS, DEDUP_KEY
+
+
+def summable_volume(volume):
+    """Volume para somar: o float32 do armazenamento compacto vira float64 (somas longas em float32 perdem kg)"""
+    return volume.astype('float64') if volume.dtype == np.float32 else volume
+
+
+def aggregate_cube(df):
+    """Agrega NCs e volume por (ano, cliente, categoria, tipo)"""
+    df = df.assign(volume_impactado=summable_volume(df['volume_impactado']))
+    return df.groupby(CUBE_DIMENSIONS, observed=True).agg(
+        ncs=('data', 'size'),
+        volume_impactado=('volume_impactado', 'sum')
+    ).reset_index()
+
+
+def merge_cubes(cubos, df):
+    """Soma cubos parciais, reaplicando os dicionários categóricos do df completo"""
+    cubo = pd.concat(cubos, ignore_index=True)
+    cubo['volume_impactado'] = summable_volume(cubo['volume_impactado'])
+    cubo = cubo.groupby(CUBE_DIMENSIONS, observed=True)[['ncs', 'volume_impactado']].sum().reset_index()
+    for coluna in CUBE_DIMENSIONS:
+        cubo[coluna] = cubo[coluna].astype(df[coluna].dtype)
+    return cubo
+
+
+def slice_cube(cubo, selecoes, ignorar=None):
+    """Recorta o cubo pelas seleções de filtro (listas vazias não filtram)"""
+    mascara = np.ones(len(cubo), dtype=bool)
+    for dimensao, valores in selecoes.items():
+        if valores and dimensao != ignorar:
+            mascara &= cubo[dimensao].isin(valores).to_numpy()
+    return cubo[mascara]
+
+
+def rollup_cube(cubo, dimensao, top=None):
+    """Consolida o cubo em uma dimensão, ordenando por número de NCs"""
+    agregado = cubo.groupby(dimensao, observed=True)[['ncs', 'volume_impactado']].sum()
+    # Mesma ordem de sql_rollup (ORDER BY ncs DESC, dimensão): empates pelo texto, não pela ordem das categorias
+    agregado = agregado.sort_values(
+        ['ncs', dimensao],
+        ascending=[False, True],
+        kind='stable',
+        key=lambda coluna: coluna.astype(str) if isinstance(coluna.dtype, pd.CategoricalDtype) else coluna
+    )
+    return agregado.head(top) if top else agregado
+
+
+def annual_evolution(cubo, selecoes):
+    """NCs e volume por ano, respeitando todos os filtros menos o de ano"""
+    return slice_cube(cubo, selecoes, ignorar='ano').groupby('ano')[['ncs', 'volume_impactado']].sum().reset_index()
+
+
+def kpi_summary(cubo, selecoes):
+    """Total de NCs, volume e tendência (% entre o primeiro e o último ano escolhidos, None se < 2 anos)"""
+    cubo_filtrado = slice_cube(cubo, selecoes)
+    anos_selecionados = selecoes.get('ano') or []
+    
+    tendencia = None
+    if len(anos_selecionados) >= 2:
+        anos_ord = sorted(anos_selecionados)
+        ncs_por_ano = annual_evolution(cubo, selecoes).set_index('ano')['ncs']
+        primeiro = ncs_por_ano.get(anos_ord[0], 0)
+        ultimo = ncs_por_ano.get(anos_ord[-1], 0)
+        tendencia = ((ultimo - primeiro) / primeiro * 100) if primeiro > 0 else 0
+    
+    return {
+        'total_ncs': int(cubo_filtrado['ncs'].sum()),
+        'volume_total': cubo_filtrado['volume_impactado'].sum(),
+        'tendencia': tendencia
+    }
+
+
+def record_key_hashes(df):
+    """Hash da chave estável de cada registro (data + cliente + status + tipo)"""
+    return pd.util.hash_pandas_object(df[DEDUP_KEY], index=False).to_numpy()
+
+
+def sorted_key_hashes(df):
+    """Hashes ordenados das chaves, prontos para busca binária"""
+    return np.sort(record_key_hashes(df))
+
+
+def new_record_mask(hashes_base, hashes_novo):
+    """Registros do acréscimo ausentes da base (hashes ordenados).
+    
+    Repetições dentro do próprio acréscimo são mantidas, como na ingestão de
+    uma planilha (duas NCs legítimas podem ter a mesma chave no mesmo mês).
+    """
+    # Busca binária nas chaves existentes: custo proporcional ao tamanho do acréscimo
+    posicoes = np.searchsorted(hashes_base, hashes_novo)
+    existentes = np.zeros(len(hashes_novo), dtype=bool)
+    if len(hashes_base):
+        existentes = hashes_base[np.minimum(posicoes, len(hashes_base) - 1)] == hashes_novo
+    return ~existentes
+
+
+def merge_key_hashes(hashes_base, hashes_novos):
+    """Hashes ordenados da base acrescida das chaves novas"""
+    return np.sort(np.concatenate([hashes_base, hashes_novos]), kind='stable')
@@ -0,0 +1,149 @@
+"""Recorrências e anomalias no histórico de NCs, calculadas de forma vetorizada (sem laço por linha)"""
+import numpy as np
+
+# Recorrência: mesma combinação cliente + tipo; repetir em até RECURRENCE_WINDOW_DAYS dias sinaliza a NC
+RECURRENCE_KEY = ['cliente', 'tipo']
+RECURRENCE_WINDOW_DAYS = 90
+RECURRENCE_MIN_OCCURRENCES = 3
+
+# Status repetido: mesmo código de status do mesmo cliente mais de uma vez
+STATUS_KEY = ['cliente', 'status']
+
+# Volume atípico: acima de Q3 + k·IQR do tipo (ou do histórico todo, em tipos com poucas NCs)
+OUTLIER_IQR_FACTOR = 1.5
+OUTLIER_MIN_GROUP = 8
+
+RECURRENCE_COLUMNS = {
+    'cliente': 'Cliente',
+    'tipo': 'Tipo',
+    'ocorrencias': 'NCs',
+    'recorrencias_janela': f'Em até {RECURRENCE_WINDOW_DAYS} dias',
+    'menor_intervalo_dias': 'Menor intervalo (dias)',
+    'intervalo_medio_dias': 'Intervalo médio (dias)',
+    'ultima_formatada': 'Última'
+}
+
+ANOMALY_COLUMNS = {
+    'data_formatada': 'Data',
+    'cliente': 'Cliente',
+    'tipo': 'Tipo',
+    'status': 'Status',
+    'volume_impactado': 'Volume (kg)',
+    'motivo': 'Motivo'
+}
+
+
+def occurrence_order(df, colunas, ordem_datas=None):
+    """Para cada linha: dias desde a NC anterior da mesma combinação (NaN na primeira) e posição (1, 2, ...)"""
+    grupos = df.groupby(colunas, observed=True, sort=False).ngroup().to_numpy()
+    dias = df['data'].to_numpy().astype('datetime64[D]').astype('i8')
+    if ordem_datas is None:
+        ordem_datas = np.argsort(dias, kind='stable')
+    # Ordem por (combinação, data) sem laço por grupo: ordenação estável dos códigos já em ordem de data
+    # (códigos pequenos cabem em 8/16 bits, e o numpy usa radix sort)
+    grupos_por_data = grupos[ordem_datas].astype(np.min_scalar_type(grupos.max(initial=0)))
+    ordem = ordem_datas[np.argsort(grupos_por_data, kind='stable')]
+    grupos_ord, dias_ord = grupos[ordem], dias[ordem]
+    mesmo_grupo = np.r_[False, grupos_ord[1:] == grupos_ord[:-1]]
+    inicios = np.flatnonzero(~mesmo_grupo)
+    tamanhos = np.diff(np.r_[inicios, len(ordem)])
+    
+    intervalo = np.empty(len(ordem))
+    intervalo[ordem] = np.where(mesmo_grupo, np.r_[0, np.diff(dias_ord)], np.nan)
+    posicao = np.empty(len(ordem), dtype=np.int64)
+    posicao[ordem] = np.arange(len(ordem)) - np.repeat(inicios, tamanhos) + 1
+    return intervalo, posicao
+
+
+def volume_limits(df, coluna='tipo'):
+    """Limite de volume atípico de cada linha (Q3 + k·IQR do seu tipo ou, em tipos pequenos, do histórico)"""
+    volumes = df['volume_impactado'].astype('float64')
+    q1, q3 = volumes.quantile([0.25, 0.75])
+    limite_geral = q3 + OUTLIER_IQR_FACTOR * (q3 - q1)
+    
+    por_grupo = volumes.groupby(df[coluna], observed=True)
+    quartis = por_grupo.quantile([0.25, 0.75]).unstack()
+    limites = quartis[0.75] + OUTLIER_IQR_FACTOR * (quartis[0.75] - quartis[0.25])
+    limites = limites.where(por_grupo.size() >= OUTLIER_MIN_GROUP, limite_geral)
+    limites = limites.reindex(df[coluna].cat.categories, fill_value=limite_geral).to_numpy()
+    return limites[df[coluna].cat.codes.to_numpy()]
+
+
+def detect_anomalies(df):
+    """Recorrências por (cliente, tipo) e NCs sinalizadas sobre o histórico inteiro.
+    
+    Uma NC é sinalizada quando repete cliente + tipo em até RECURRENCE_WINDOW_DAYS
+    dias, repete um código de status do mesmo cliente ou tem volume atípico.
+    """
+    ordem_datas = np.argsort(df['data'].to_numpy(), kind='stable')
+    intervalo, _ = occurrence_order(df, RECURRENCE_KEY, ordem_datas)
+    _, repeticao_status = occurrence_order(df, STATUS_KEY, ordem_datas)
+    limite = volume_limits(df)
+    volumes = df['volume_impactado'].to_numpy()
+    
+    recorrencia = intervalo <= RECURRENCE_WINDOW_DAYS
+    status_repetido = repeticao_status >= 2
+    volume_atipico = (volumes > limite) & (volumes > 0)
+    
+    marcadas = df.assign(
+        intervalo_dias=intervalo,
+        ocorrencia_status=repeticao_status,
+        limite_volume=limite,
+        recorrencia=recorrencia,
+        status_repetido=status_repetido,
+        volume_atipico=volume_atipico
+    )
+    
+    recorrencias = marcadas.groupby(RECURRENCE_KEY, observed=True).agg(
+        ocorrencias=('data', 'size'),
+        primeira=('data', 'min'),
+        ultima=('data', 'max'),
+        intervalo_medio_dias=('intervalo_dias', 'mean'),
+        menor_intervalo_dias=('intervalo_dias', 'min'),
+        recorrencias_janela=('recorrencia', 'sum'),
+        status_distintos=('status', 'nunique'),
+        volume_total=('volume_impactado', 'sum')
+    ).reset_index()
+    recorrencias = recorrencias[recorrencias['ocorrencias'] >= RECURRENCE_MIN_OCCURRENCES].sort_values(
+        ['recorrencias_janela', 'ocorrencias', 'ultima'], ascending=False, kind='stable'
+    )
+    
+    ocorrencias = marcadas[recorrencia | status_repetido | volume_atipico].sort_values('data', ascending=False, kind='stable')
+    return {'recorrencias': recorrencias.reset_index(drop=True), 'ocorrencias': ocorrencias}
+
+
+def slice_anomalies(deteccao, selecoes):
+    """Recorta a detecção pelas seleções de filtro (só nas colunas que cada tabela possui)"""
+    recortes = {}
+    for nome, tabela in deteccao.items():
+        mascara = np.ones(len(tabela), dtype=bool)
+        for dimensao, valores in selecoes.items():
+            if valores and dimensao in tabela.columns:
+                mascara &= tabela[dimensao].isin(valores).to_numpy()
+        recortes[nome] = tabela[mascara]
+    return recortes
+
+
+def format_recurrences(recorrencias):
+    """Formata o resumo de recorrências para exibição"""
+    tabela = recorrencias.assign(
+        ultima_formatada=recorrencias['ultima'].dt.strftime('%d/%m/%Y'),
+        intervalo_medio_dias=recorrencias['intervalo_medio_dias'].round(0)
+    )
+    return tabela[list(RECURRENCE_COLUMNS)].rename(columns=RECURRENCE_COLUMNS)
+
+
+def format_anomalies(ocorrencias):
+    """Formata só as NCs sinalizadas exibidas, com o motivo de cada sinalização"""
+    motivos = []
+    for linha in ocorrencias.itertuples():
+        partes = []
+        if linha.recorrencia:
+            partes.append(f"Repetiu cliente + tipo em {linha.intervalo_dias:.0f} dias")
+        if linha.status_repetido:
+            partes.append(f"Status {linha.status} pela {linha.ocorrencia_status}ª vez")
+        if linha.volume_atipico:
+            partes.append(f"Volume atípico (limite {linha.limite_volume:.0f} kg)")
+        motivos.append(" · ".join(partes))
+    tabela = ocorrencias.assign(data_formatada=ocorrencias['data'].dt.strftime('%d/%m/%Y'), motivo=motivos)
+    return tabela[list(ANOMALY_COLUMNS)].rename(columns=ANOMALY_COLUMNS)
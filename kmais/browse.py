@@ -0,0 +1,65 @@
+"""Navegação paginada pelos registros: ordem por data montada uma vez, páginas como fatias"""
+import numpy as np
+
+from kmais.constants import CATEGORICAL_COLUMNS
+
+# Colunas exibidas na tabela de registros e seus rótulos
+RECORD_COLUMNS = {
+    'data_formatada': 'Data',
+    'cliente': 'Cliente',
+    'categoria': 'Categoria',
+    'tipo': 'Tipo',
+    'volume_impactado': 'Volume (kg)',
+    'status': 'Status'
+}
+
+
+def build_date_order(df):
+    """Ids de linha do mais recente para o mais antigo (empates mantêm a ordem original)"""
+    datas = df['data'].to_numpy().astype('datetime64[ns]').view('i8')
+    return np.argsort(-datas, kind='stable').astype(np.int32)
+
+
+def search_mask(df, termo):
+    """Linhas em que algum texto (cliente, categoria, tipo, status) contém o termo (None = sem busca)"""
+    termo = ' '.join(str(termo or '').split()).casefold()
+    if not termo:
+        return None
+    mascara = np.zeros(len(df), dtype=bool)
+    for coluna in CATEGORICAL_COLUMNS:
+        # A busca percorre só o dicionário de cada coluna; as linhas são marcadas pelos códigos
+        categorias = df[coluna].cat.categories
+        encontrados = [i for i, valor in enumerate(categorias) if termo in str(valor).casefold()]
+        if encontrados:
+            mascara |= np.isin(df[coluna].cat.codes.to_numpy(), encontrados)
+    return mascara
+
+
+def browse_order(ordem, total_linhas, linhas=None, mascara=None):
+    """Restringe a ordem por data às linhas filtradas e encontradas pela busca, sem reordenar"""
+    if linhas is None and mascara is None:
+        return ordem
+    selecionadas = np.ones(total_linhas, dtype=bool) if mascara is None else mascara.copy()
+    if linhas is not None:
+        filtradas = np.zeros(total_linhas, dtype=bool)
+        filtradas[linhas] = True
+        selecionadas &= filtradas
+    return ordem[selecionadas[ordem]]
+
+
+def page_count(total, tamanho_pagina):
+    """Número de páginas (ao menos uma, mesmo sem registros)"""
+    return max(1, -(-total // tamanho_pagina))
+
+
+def page_rows(ordem, pagina, tamanho_pagina):
+    """Ids de linha da página (1 = mais recentes): uma fatia da ordem pré-calculada"""
+    inicio = (pagina - 1) * tamanho_pagina
+    return ordem[inicio:inicio + tamanho_pagina]
+
+
+def format_records(df, linhas):
+    """Formata apenas as linhas da página para exibição"""
+    pagina = df.take(linhas)
+    pagina = pagina.assign(data_formatada=pagina['data'].dt.strftime('%d/%m/%Y'))
+    return pagina[list(RECORD_COLUMNS)].rename(columns=RECORD_COLUMNS)
@@ -0,0 +1,183 @@
+"""Figuras Plotly do dashboard, construídas a partir de agregados do cubo"""
+from kmais.timeseries import GRANULARITIES
+
+ROTULOS_METRICA = {'ncs': "Número de NCs", 'volume_impactado': "Volume Impactado (kg)"}
+
+
+def _plotly_express():
+    """Plotly é importado sob demanda, na primeira figura construída"""
+    import plotly.express as px
+    return px
+
+
+def _plotly_graph_objects():
+    """Plotly (graph_objects) importado sob demanda"""
+    import plotly.graph_objects as go
+    return go
+
+
+def _figure_evolucao_ncs(evolucao):
+    """Barras de NCs por ano"""
+    px = _plotly_express()
+    fig = px.bar(
+        evolucao, 
+        x='ano', 
+        y='ncs',
+        title="Número de NCs por Ano",
+        color_discrete_sequence=['#E30613'],
+        text='ncs'
+    )
+    fig.update_layout(
+        height=400,
+        showlegend=False,
+        xaxis_title="Ano",
+        yaxis_title="Número de NCs"
+    )
+    fig.update_traces(textposition='outside')
+    return fig
+
+
+def _figure_evolucao_volume(evolucao):
+    """Linha de volume impactado por ano"""
+    px = _plotly_express()
+    fig = px.line(
+        evolucao,
+        x='ano',
+        y='volume_impactado',
+        title="Volume Impactado (kg) por Ano",
+        markers=True,
+        color_discrete_sequence=['#E30613']
+    )
+    fig.update_layout(
+        height=400,
+        showlegend=False,
+        xaxis_title="Ano",
+        yaxis_title="Volume Impactado (kg)"
+    )
+    return fig
+
+
+def _figure_top_clientes(clientes):
+    """Barras horizontais dos principais clientes"""
+    px = _plotly_express()
+    fig = px.bar(
+        clientes.reset_index(),
+        x='ncs',
+        y='cliente',
+        orientation='h',
+        title="Principais Clientes por Número de NCs",
+        color_discrete_sequence=['#E30613'],
+        text='ncs'
+    )
+    fig.update_layout(
+        height=400,
+        showlegend=False,
+        xaxis_title="Número de NCs",
+        yaxis_title="Cliente"
+    )
+    fig.update_traces(textposition='outside')
+    return fig
+
+
+def _figure_categorias(categorias):
+    """Pizza da distribuição por categoria"""
+    px = _plotly_express()
+    fig = px.pie(
+        categorias.reset_index(),
+        values='ncs',
+        names='categoria',
+        title="Distribuição por Categoria",
+        color_discrete_sequence=['#E30613', '#17a2b8', '#ffc107', '#28a745']
+    )
+    fig.update_layout(height=400)
+    fig.update_traces(textposition='inside', textinfo='percent+label')
+    return fig
+
+
+def _figure_serie_temporal(serie, metrica='ncs', granularidade='mensal', janela=3):
+    """Barras por período com a média móvel da janela escolhida"""
+    go = _plotly_graph_objects()
+    rotulo = ROTULOS_METRICA[metrica]
+    periodo = GRANULARITIES[granularidade]
+    fig = go.Figure()
+    fig.add_bar(
+        x=serie['periodo'].to_numpy(),
+        y=serie[metrica],
+        name=f"{rotulo} por {periodo['rotulo']}",
+        marker_color='#E30613',
+        opacity=0.6
+    )
+    fig.add_scatter(
+        x=serie['periodo'].to_numpy(),
+        y=serie[f'{metrica}_media'],
+        name=f"Média móvel ({janela} {periodo['plural']})",
+        mode='lines',
+        line=dict(color='#17a2b8', width=3)
+    )
+    fig.update_layout(
+        height=400,
+        title=f"{rotulo} por {periodo['rotulo']}",
+        xaxis_title="Período",
+        yaxis_title=rotulo,
+        legend=dict(orientation='h', yanchor='bottom', y=1.02, x=0)
+    )
+    return fig
+
+
+def _figure_mapa_calor(matriz, metrica='ncs'):
+    """Mapa de calor cliente × tipo (células vazias = sem NC)"""
+    go = _plotly_graph_objects()
+    rotulo = ROTULOS_METRICA[metrica]
+    fig = go.Figure(go.Heatmap(
+        z=matriz.to_numpy(),
+        x=list(matriz.columns),
+        y=list(matriz.index),
+        colorscale=[[0, '#fde3e4'], [1, '#E30613']],
+        hoverongaps=False,
+        texttemplate='%{z:.0f}',
+        colorbar=dict(title=rotulo),
+        hovertemplate="Cliente: %{y}<br>Tipo: %{x}<br>" + rotulo + ": %{z:.0f}<extra></extra>"
+    ))
+    fig.update_layout(
+        height=max(400, 28 * len(matriz) + 160),
+        title=f"{rotulo} por Cliente e Tipo",
+        xaxis_title="Tipo",
+        yaxis_title="Cliente",
+        yaxis=dict(autorange='reversed')
+    )
+    return fig
+
+
+def _figure_mapa_calor_mensal(tabela, metrica='ncs', cliente=''):
+    """Mapa de calor tipo × mês de um cliente"""
+    go = _plotly_graph_objects()
+    rotulo = ROTULOS_METRICA[metrica]
+    fig = go.Figure(go.Heatmap(
+        z=tabela.to_numpy(),
+        x=tabela.columns.strftime('%m/%Y'),
+        y=list(tabela.index),
+        colorscale=[[0, '#fde3e4'], [1, '#E30613']],
+        hoverongaps=False,
+        texttemplate='%{z:.0f}',
+        colorbar=dict(title=rotulo),
+        hovertemplate="Tipo: %{y}<br>Mês: %{x}<br>" + rotulo + ": %{z:.0f}<extra></extra>"
+    ))
+    fig.update_layout(
+        height=max(300, 28 * len(tabela) + 160),
+        title=f"{rotulo} de {cliente} por Tipo e Mês",
+        xaxis_title="Mês",
+        yaxis_title="Tipo",
+        xaxis=dict(type='category'),
+        yaxis=dict(autorange='reversed')
+    )
+    return fig
+
+CHART_BUILDERS = {
+    'evolucao_ncs': _figure_evolucao_ncs,
+    'evolucao_volume': _figure_evolucao_volume,
+    'top_clientes': _figure_top_clientes,
+    'categorias': _figure_categorias,
+    'serie_temporal': _figure_serie_temporal,
+    'mapa_calor': _figure_mapa_calor,
+    'mapa_calor_mensal': _figure_mapa_calor_mensal
+}
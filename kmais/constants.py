@@ -0,0 +1,48 @@
+"""Caminhos e esquema dos dados de não conformidades"""
+from pathlib import Path
+
+# Planilhas de NC e snapshots colunares e bases SQLite gerados a partir delas
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+SNAPSHOT_DIR = DATA_DIR / 'snapshots'
+DATABASE_DIR = DATA_DIR / 'sqlite'
+FONTE_PADRAO = "Dados padrão (NCKmais22-25)"
+
+# Regras de tradução/unificação versionadas (trocar a versão invalida caches e snapshots)
+NORMALIZATION_RULES_PATH = DATA_DIR / 'normalizacao.json'
+
+# Colunas de texto mantidas como categóricas (códigos inteiros + dicionário)
+CATEGORICAL_COLUMNS = ['cliente', 'categoria', 'tipo', 'status']
+
+# Dimensões do cubo pré-agregado
+CUBE_DIMENSIONS = ['ano', 'cliente', 'categoria', 'tipo']
+
+# Dimensões com índice invertido para filtros
+FILTER_DIMENSIONS = ['ano', 'cliente', 'categoria', 'tipo']
+
+# Planilhas .xlsx acima deste tamanho são lidas em lotes (openpyxl somente leitura)
+STREAMING_THRESHOLD_BYTES = 20 * 1024 * 1024
+STREAMING_BATCH_ROWS = 50_000
+
+# Chave estável usada para deduplicar acréscimos
+DEDUP_KEY = ['data', 'cliente', 'status', 'tipo']
+
+# Consultas livres na base SQLite: linhas devolvidas e tempo máximo de execução
+QUERY_MAX_ROWS = 1000
+QUERY_TIMEOUT_SECONDS = 5
+
+# Colunas obrigatórias das planilhas, nesta ordem: nas quatro primeiras posições valem pela posição
+REQUIRED_COLUMNS = ['data', 'cliente', 'categoria', 'tipo']
+
+# Palavras do cabeçalho que identificam cada coluna, em ordem de prioridade
+COLUMN_KEYWORDS = {
+    'data': ('data',),
+    'cliente': ('cliente',),
+    'categoria': ('categoria',),
+    'tipo': ('tipo',),
+    'volume_impactado': ('volume', 'kg'),
+    'status': ('status',)
+}
+
+# Validação de uploads: linhas lidas na amostra e fração mínima de datas válidas
+VALIDATION_SAMPLE_ROWS = 200
+VALIDATION_MIN_DATE_RATIO = 0.9
@@ -0,0 +1,199 @@
+"""Base SQLite local (arquivo, sem servidor) com o histórico de NCs e agregações em SQL.
+
+Cada versão dos dados vira um arquivo em data/sqlite/, carregado uma vez e
+depois só lido: KPIs, rankings e evolução anual são consultas com índices em
+data, ano, cliente e categoria, e analistas podem fazer consultas próprias
+(somente leitura) sobre a tabela `ncs`.
+"""
+import hashlib
+import re
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+import pandas as pd
+
+from kmais.constants import DATABASE_DIR, QUERY_MAX_ROWS, QUERY_TIMEOUT_SECONDS
+
+# Incrementar ao mudar o esquema (gera arquivos novos em vez de reaproveitar os antigos)
+SCHEMA_VERSION = 1
+
+SCHEMA = """
+CREATE TABLE ncs (
+    data TEXT NOT NULL,
+    ano INTEGER NOT NULL,
+    cliente TEXT,
+    categoria TEXT,
+    tipo TEXT,
+    status TEXT,
+    volume_impactado REAL
+);
+CREATE TABLE metadados (chave TEXT PRIMARY KEY, valor TEXT);
+"""
+
+INDEXES = """
+CREATE INDEX idx_ncs_data ON ncs (data);
+CREATE INDEX idx_ncs_ano ON ncs (ano);
+CREATE INDEX idx_ncs_cliente ON ncs (cliente);
+CREATE INDEX idx_ncs_categoria ON ncs (categoria);
+-- Índice de cobertura das agregações: KPIs e rankings são lidos só do índice, sem tocar a tabela
+CREATE INDEX idx_ncs_cubo ON ncs (ano, cliente, categoria, tipo, volume_impactado);
+"""
+
+TABLE_COLUMNS = ['data', 'ano', 'cliente', 'categoria', 'tipo', 'status', 'volume_impactado']
+
+# Operações liberadas nas consultas livres: só leitura de tabelas e funções
+_LEITURA = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION, sqlite3.SQLITE_RECURSIVE}
+_CONSULTA_LIVRE = re.compile(r'^\s*(select|with)\b', re.IGNORECASE)
+
+
+def database_path(versao_dados, pasta=DATABASE_DIR):
+    """Arquivo SQLite de uma versão dos dados"""
+    chave = hashlib.sha256(f"{versao_dados}:s{SCHEMA_VERSION}".encode()).hexdigest()[:16]
+    return Path(pasta) / f"ncs-{chave}.sqlite"
+
+
+def _connect(caminho):
+    """Conexão somente leitura (o arquivo nunca é alterado depois de carregado)"""
+    return sqlite3.connect(f"{caminho.as_uri()}?mode=ro", uri=True, check_same_thread=False)
+
+
+def _stored_version(caminho):
+    """versao_dados gravada nos metadados do arquivo (None se ausente ou ilegível)"""
+    try:
+        with closing(_connect(caminho)) as con:
+            linha = con.execute("SELECT valor FROM metadados WHERE chave = 'versao_dados'").fetchone()
+    except sqlite3.Error:
+        return None
+    return linha[0] if linha else None
+
+
+def build_database(df, versao_dados, pasta=DATABASE_DIR, reaproveitar=True):
+    """Base da versão dos dados (tabela, índices e metadados), devolvendo o caminho do arquivo.
+    
+    Um arquivo da mesma versão já carregado (por este ou por um processo
+    anterior) é reaproveitado: a versão identifica os dados, que não mudam.
+    """
+    destino = database_path(versao_dados, pasta)
+    if reaproveitar and destino.exists() and _stored_version(destino) == versao_dados:
+        return destino
+    Path(pasta).mkdir(parents=True, exist_ok=True)
+    temporario = destino.with_suffix('.tmp')
+    temporario.unlink(missing_ok=True)
+    
+    linhas = pd.DataFrame({
+        'data': df['data'].dt.strftime('%Y-%m-%d'),
+        'ano': df['ano'].astype('int64'),
+        **{coluna: df[coluna].astype(str) for coluna in ['cliente', 'categoria', 'tipo', 'status']},
+        'volume_impactado': df['volume_impactado'].astype('float64')
+    })
+    with closing(sqlite3.connect(temporario)) as con:
+        con.executescript(SCHEMA)
+        # Índices criados depois da carga: uma ordenação por índice em vez de atualizações linha a linha
+        con.executemany(
+            f"INSERT INTO ncs VALUES ({', '.join('?' * len(TABLE_COLUMNS))})",
+            linhas[TABLE_COLUMNS].itertuples(index=False, name=None)
+        )
+        con.executescript(INDEXES)
+        con.executemany("INSERT INTO metadados VALUES (?, ?)", [
+            ('versao_dados', versao_dados),
+            ('registros', str(len(linhas)))
+        ])
+        con.execute("ANALYZE")
+        con.commit()
+    # Troca atômica: leitores nunca veem um arquivo pela metade
+    temporario.replace(destino)
+    return destino
+
+
+def prune_databases(manter, pasta=DATABASE_DIR):
+    """Apaga as bases das versões fora de `manter` (versões ainda em uso) e devolve quantas apagou"""
+    preservar = {database_path(versao_dados, pasta) for versao_dados in manter}
+    removidas = 0
+    for caminho in Path(pasta).glob('ncs-*.sqlite'):
+        if caminho not in preservar:
+            caminho.unlink(missing_ok=True)
+            removidas += 1
+    return removidas
+
+
+def _where(selecoes, ignorar=None):
+    """Cláusula WHERE e parâmetros das seleções de filtro (listas vazias não filtram)"""
+    condicoes = []
+    parametros = []
+    for dimensao, valores in selecoes.items():
+        if valores and dimensao != ignorar:
+            condicoes.append(f"{dimensao} IN ({', '.join('?' * len(valores))})")
+            parametros.extend(int(valor) if dimensao == 'ano' else str(valor) for valor in valores)
+    return (f"WHERE {' AND '.join(condicoes)}" if condicoes else ""), parametros
+
+
+def sql_annual_evolution(caminho, selecoes):
+    """NCs e volume por ano, respeitando todos os filtros menos o de ano"""
+    where, parametros = _where(selecoes, ignorar='ano')
+    with closing(_connect(caminho)) as con:
+        return pd.read_sql_query(
+            f"SELECT ano, COUNT(*) AS ncs, SUM(volume_impactado) AS volume_impactado "
+            f"FROM ncs {where} GROUP BY ano ORDER BY ano",
+            con, params=parametros
+        )
+
+
+def sql_rollup(caminho, selecoes, dimensao, top=None):
+    """NCs e volume por valor da dimensão na seleção, do maior número de NCs para o menor"""
+    where, parametros = _where(selecoes)
+    limite = f"LIMIT {int(top)}" if top else ""
+    with closing(_connect(caminho)) as con:
+        return pd.read_sql_query(
+            f"SELECT {dimensao}, COUNT(*) AS ncs, SUM(volume_impactado) AS volume_impactado "
+            f"FROM ncs {where} GROUP BY {dimensao} ORDER BY ncs DESC, {dimensao} {limite}",
+            con, params=parametros, index_col=dimensao
+        )
+
+
+def sql_kpi_summary(caminho, selecoes):
+    """Mesmo resultado de kmais.kpi_summary, calculado na base SQLite"""
+    where, parametros = _where(selecoes)
+    with closing(_connect(caminho)) as con:
+        total_ncs, volume_total = con.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(volume_impactado), 0) FROM ncs {where}", parametros
+        ).fetchone()
+    anos_selecionados = selecoes.get('ano') or []
+    
+    tendencia = None
+    if len(anos_selecionados) >= 2:
+        anos_ord = sorted(anos_selecionados)
+        ncs_por_ano = sql_annual_evolution(caminho, selecoes).set_index('ano')['ncs']
+        primeiro = ncs_por_ano.get(anos_ord[0], 0)
+        ultimo = ncs_por_ano.get(anos_ord[-1], 0)
+        tendencia = ((ultimo - primeiro) / primeiro * 100) if primeiro > 0 else 0
+    
+    return {
+        'total_ncs': int(total_ncs),
+        'volume_total': volume_total,
+        'tendencia': tendencia
+    }
+
+
+def _authorize(acao, *_):
+    """Nega tudo que não seja leitura (ATTACH, PRAGMA, escrita...)"""
+    return sqlite3.SQLITE_OK if acao in _LEITURA else sqlite3.SQLITE_DENY
+
+
+def run_query(caminho, consulta, limite=QUERY_MAX_ROWS, tempo_maximo=QUERY_TIMEOUT_SECONDS):
+    """Consulta livre somente leitura: um único SELECT/WITH, até `limite` linhas e `tempo_maximo` segundos"""
+    # Mais de um comando na mesma consulta é recusado pelo próprio sqlite3 (ProgrammingError)
+    consulta = consulta.strip().rstrip(';')
+    if not _CONSULTA_LIVRE.match(consulta):
+        raise ValueError("Use uma única consulta SELECT (ou WITH ... SELECT)")
+    
+    prazo = time.monotonic() + tempo_maximo
+    with closing(_connect(caminho)) as con:
+        con.set_authorizer(_authorize)
+        # Consultas longas são interrompidas (sqlite3.OperationalError: interrupted)
+        con.set_progress_handler(lambda: time.monotonic() > prazo, 10_000)
+        cursor = con.execute(consulta)
+        linhas = cursor.fetchmany(limite)
+        colunas = [descricao[0] for descricao in cursor.description]
+    return pd.DataFrame.from_records(linhas, columns=colunas)
@@ -0,0 +1,41 @@
+"""Drill-down cliente × tipo × mês a partir do cubo temporal mensal (esparso: só combinações com NC)"""
+import pandas as pd
+
+from kmais.timeseries import slice_time_cube
+
+# Tamanho do mapa de calor: clientes e tipos com mais NCs (ou volume) na seleção
+DRILL_TOP_CLIENTS = 15
+DRILL_TOP_TYPES = 12
+
+
+def drill_matrix(cubo_mensal, selecoes, metrica='ncs', top_clientes=DRILL_TOP_CLIENTS, top_tipos=DRILL_TOP_TYPES):
+    """Matriz cliente × tipo da métrica (NaN = sem NC).
+
+    Ano e categoria recortam a matriz; os filtros de cliente e tipo não, para
+    que ela continue servindo de mapa depois de uma célula ser escolhida.
+    """
+    recorte = slice_time_cube(cubo_mensal, selecoes, ignorar=('cliente', 'tipo'))
+    totais = recorte.groupby(['cliente', 'tipo'], observed=True)[metrica].sum()
+    if totais.empty:
+        return pd.DataFrame()
+    
+    clientes = totais.groupby(level='cliente', observed=True).sum().nlargest(top_clientes).index
+    tipos = totais.groupby(level='tipo', observed=True).sum().nlargest(top_tipos).index
+    matriz = totais.unstack('tipo').reindex(index=clientes, columns=tipos)
+    matriz.index = matriz.index.astype(str)
+    matriz.columns = matriz.columns.astype(str)
+    return matriz
+
+
+def drill_history(cubo_mensal, selecoes, cliente, metrica='ncs'):
+    """Matriz tipo × mês de um cliente, com todos os meses do intervalo (NaN = sem NC)"""
+    recorte = slice_time_cube(cubo_mensal, {**selecoes, 'cliente': [cliente], 'tipo': []})
+    if recorte.empty:
+        return pd.DataFrame()
+    
+    tabela = recorte.groupby(['tipo', 'periodo'], observed=True)[metrica].sum().unstack('periodo')
+    meses = pd.date_range(recorte['periodo'].min(), recorte['periodo'].max(), freq='MS')
+    tabela = tabela.reindex(columns=meses)
+    tabela = tabela.loc[tabela.sum(axis=1).sort_values(ascending=False, kind='stable').index]
+    tabela.index = tabela.index.astype(str)
+    return tabela
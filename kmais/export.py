@@ -0,0 +1,113 @@
+"""Exportação dos registros filtrados e dos rankings em CSV, Parquet ou Excel, gravada em blocos"""
+import gzip
+import io
+import tempfile
+
+import numpy as np
+
+from kmais.aggregate import rollup_cube, slice_cube
+
+# Formatos oferecidos (o .xlsx já é compactado; CSV em gzip e Parquet em zstd)
+EXPORT_FORMATS = {
+    'csv': {'rotulo': "CSV", 'extensao': 'csv', 'mime': 'text/csv'},
+    'csv.gz': {'rotulo': "CSV compactado (gzip)", 'extensao': 'csv.gz', 'mime': 'application/gzip'},
+    'parquet': {'rotulo': "Parquet (zstd)", 'extensao': 'parquet', 'mime': 'application/vnd.apache.parquet'},
+    'xlsx': {
+        'rotulo': "Excel",
+        'extensao': 'xlsx',
+        'mime': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    }
+}
+
+# Registros gravados por bloco e tamanho até o qual o arquivo em construção fica só em memória
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_SPOOL_BYTES = 32 * 1024 * 1024
+
+# Limite de linhas de uma planilha Excel (sem o cabeçalho)
+EXCEL_MAX_ROWS = 1_048_575
+
+EXPORT_COLUMNS = ['data', 'ano', 'cliente', 'categoria', 'tipo', 'status', 'volume_impactado']
+
+
+def iter_record_chunks(df, linhas=None, tamanho=EXPORT_CHUNK_ROWS):
+    """Registros filtrados (todas as linhas se `linhas` for None) em blocos de até `tamanho` linhas"""
+    colunas = EXPORT_COLUMNS + [coluna for coluna in df.columns if coluna not in EXPORT_COLUMNS]
+    if linhas is None:
+        linhas = np.arange(len(df))
+    if len(linhas) == 0:
+        yield df[colunas].iloc[:0]
+        return
+    for inicio in range(0, len(linhas), tamanho):
+        yield df[colunas].take(linhas[inicio:inicio + tamanho])
+
+
+def ranking_table(cubo, selecoes, dimensao):
+    """Ranking completo da dimensão na seleção (NCs, % do total e volume), como nas tabelas do dashboard"""
+    ranking = rollup_cube(slice_cube(cubo, selecoes), dimensao)
+    total = ranking['ncs'].sum()
+    ranking = ranking.assign(percentual=(ranking['ncs'] / total * 100).round(1) if total else 0.0)
+    return ranking[['ncs', 'percentual', 'volume_impactado']].reset_index()
+
+
+def _write_csv(blocos, destino, compactar):
+    """CSV em UTF-8 com BOM (abre acentuado no Excel); gzip sem data no cabeçalho, para bytes reproduzíveis"""
+    saida = gzip.GzipFile(fileobj=destino, mode='wb', mtime=0) if compactar else destino
+    texto = io.TextIOWrapper(saida, encoding='utf-8-sig', newline='')
+    for i, bloco in enumerate(blocos):
+        bloco.to_csv(texto, index=False, header=(i == 0), date_format='%Y-%m-%d')
+    texto.flush()
+    texto.detach()
+    if compactar:
+        saida.close()
+
+
+def _write_parquet(blocos, destino):
+    """Parquet com um row group por bloco"""
+    import pyarrow as pa
+    from pyarrow import parquet
+    
+    escritor = None
+    for bloco in blocos:
+        tabela = pa.Table.from_pandas(bloco, preserve_index=False)
+        if escritor is None:
+            escritor = parquet.ParquetWriter(destino, tabela.schema, compression='zstd')
+        escritor.write_table(tabela)
+    escritor.close()
+
+
+def _write_excel(blocos, destino):
+    """Planilha em modo somente escrita do openpyxl: as linhas vão direto para o arquivo"""
+    from openpyxl import Workbook
+    
+    livro = Workbook(write_only=True)
+    folha = livro.create_sheet('NCs')
+    total = 0
+    for i, bloco in enumerate(blocos):
+        total += len(bloco)
+        if total > EXCEL_MAX_ROWS:
+            raise ValueError(f"O Excel aceita no máximo {EXCEL_MAX_ROWS} linhas; exporte em CSV ou Parquet")
+        if i == 0:
+            folha.append(list(bloco.columns))
+        for linha in bloco.astype(object).itertuples(index=False, name=None):
+            folha.append(linha)
+    livro.save(destino)
+
+
+def write_export(blocos, formato, destino):
+    """Grava os blocos (DataFrames com as mesmas colunas) no formato pedido, um bloco por vez"""
+    if formato in ('csv', 'csv.gz'):
+        _write_csv(blocos, destino, compactar=(formato == 'csv.gz'))
+    elif formato == 'parquet':
+        _write_parquet(blocos, destino)
+    elif formato == 'xlsx':
+        _write_excel(blocos, destino)
+    else:
+        raise ValueError(f"Formato de exportação desconhecido: {formato}")
+
+
+def export_bytes(blocos, formato):
+    """Conteúdo do arquivo exportado; a construção passa para o disco acima de EXPORT_SPOOL_BYTES"""
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_BYTES) as arquivo:
+        write_export(blocos, formato, arquivo)
+        arquivo.seek(0)
+        return arquivo.read()
@@ -0,0 +1,64 @@
+"""Índice invertido das dimensões de filtro e seleção de linhas por intersecção"""
+import numpy as np
+import pandas as pd
+
+from kmais.constants import FILTER_DIMENSIONS
+
+
+def build_filter_index(df):
+    """Índice invertido das dimensões de filtro: ids de linha ordenados por valor"""
+    indice = {}
+    for dimensao in FILTER_DIMENSIONS:
+        coluna = df[dimensao]
+        if isinstance(coluna.dtype, pd.CategoricalDtype):
+            codigos, valores = coluna.cat.codes.to_numpy(), coluna.cat.categories
+        else:
+            codigos, valores = pd.factorize(coluna, sort=True)
+        # Ordenação estável: dentro de cada valor os ids de linha ficam crescentes
+        ordem = np.argsort(codigos, kind='stable').astype(np.int32)
+        ordem = ordem[np.count_nonzero(codigos < 0):]
+        contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+        indice[dimensao] = {
+            'valores': pd.Index(valores),
+            'ordem': ordem,
+            'limites': np.concatenate([[0], np.cumsum(contagens)]),
+            'contagens': contagens
+        }
+    return indice
+
+
+def filter_options(indice, dimensao):
+    """Valores de uma dimensão que possuem ao menos um registro"""
+    return list(indice[dimensao]['valores'][indice[dimensao]['contagens'] > 0])
+
+
+def _rows_for_values(indice_dimensao, valores):
+    """Ids de linha (ordenados) com algum dos valores escolhidos"""
+    codigos = indice_dimensao['valores'].get_indexer(valores)
+    ordem, limites = indice_dimensao['ordem'], indice_dimensao['limites']
+    partes = [ordem[limites[codigo]:limites[codigo + 1]] for codigo in np.unique(codigos[codigos >= 0])]
+    if not partes:
+        return np.empty(0, dtype=ordem.dtype)
+    return np.sort(np.concatenate(partes))
+
+
+def filter_rows(indice, selecoes):
+    """Intersecção dos ids de linha de cada dimensão filtrada (None = sem filtro)"""
+    conjuntos = [_rows_for_values(indice[dimensao], valores) for dimensao, valores in selecoes.items() if valores]
+    if not conjuntos:
+        return None
+    # Começa pelo menor conjunto para que as intersecções fiquem baratas
+    conjuntos.sort(key=len)
+    linhas = conjuntos[0]
+    for conjunto in conjuntos[1:]:
+        linhas = np.intersect1d(linhas, conjunto, assume_unique=True)
+    return linhas
+
+
+def filter_state_key(selecoes, ignorar=None):
+    """Chave canônica e hasheável do estado dos filtros"""
+    return tuple(
+        (dimensao, tuple(sorted(map(str, valores))))
+        for dimensao, valores in sorted(selecoes.items())
+        if dimensao != ignorar
+    )
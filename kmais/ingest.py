@@ -0,0 +1,302 @@
+"""Leitura e limpeza das planilhas de NC (tudo em português, com tipos compactos)"""
+import io
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+try:
+    from pandas.tseries.api import guess_datetime_format
+except ImportError:
+    # pandas < 2.2: mesma função, ainda fora da API pública
+    from pandas._libs.tslibs.parsing import guess_datetime_format
+
+from kmais.aggregate import aggregate_cube, merge_cubes, record_key_hashes
+from kmais.constants import (
+    CATEGORICAL_COLUMNS,
+    COLUMN_KEYWORDS,
+    REQUIRED_COLUMNS,
+    STREAMING_BATCH_ROWS,
+    STREAMING_THRESHOLD_BYTES,
+)
+from kmais.normalize import load_normalization_rules, normalize_nc_data
+
+
+def load_default_data():
+    """Dados padrão (NCKmais22-25) já traduzidos, com tipos compactos"""
+    data = [
+        # 2025
+        {'data': '2025-06-24', 'ano': 2025, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 410, 'status': 'K069'},
+        {'data': '2025-06-19', 'ano': 2025, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J040'},
+        {'data': '2025-04-08', 'ano': 2025, 'cliente': 'Materne', 'categoria': 'Entrega', 'tipo': 'Paletização', 'volume_impactado': 0, 'status': 'J199'},
+        {'data': '2025-02-18', 'ano': 2025, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 205, 'status': 'J200'},
+        {'data': '2025-02-10', 'ano': 2025, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J183'},
+        {'data': '2025-01-06', 'ano': 2025, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Partículas estranhas', 'volume_impactado': 0, 'status': 'J144'},
+        
+        # 2024
+        {'data': '2024-10-23', 'ano': 2024, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 615, 'status': 'J097'},
+        {'data': '2024-10-02', 'ano': 2024, 'cliente': 'Synertrading', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J110'},
+        {'data': '2024-09-30', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Corpo estranho', 'volume_impactado': 0, 'status': 'J078'},
+        {'data': '2024-09-20', 'ano': 2024, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 205, 'status': 'J029'},
+        {'data': '2024-09-16', 'ano': 2024, 'cliente': 'Sumol', 'categoria': 'Produto', 'tipo': 'Mofo', 'volume_impactado': 205, 'status': 'J101'},
+        {'data': '2024-09-12', 'ano': 2024, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Mofo', 'volume_impactado': 205, 'status': 'J097'},
+        {'data': '2024-09-12', 'ano': 2024, 'cliente': 'Antilles Glaces', 'categoria': 'Entrega', 'tipo': 'Embalagem', 'volume_impactado': 0, 'status': 'J139'},
+        {'data': '2024-09-04', 'ano': 2024, 'cliente': 'Antilles Glaces', 'categoria': 'Produto', 'tipo': 'Mofo', 'volume_impactado': 205, 'status': 'H165'},
+        {'data': '2024-07-02', 'ano': 2024, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 205, 'status': 'J062'},
+        {'data': '2024-06-26', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Corpo estranho', 'volume_impactado': 0, 'status': 'J078'},
+        {'data': '2024-06-12', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Corpo estranho', 'volume_impactado': 0, 'status': 'J078'},
+        {'data': '2024-05-15', 'ano': 2024, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Defeito', 'volume_impactado': 205, 'status': 'J078'},
+        {'data': '2024-04-22', 'ano': 2024, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J029'},
+        {'data': '2024-03-18', 'ano': 2024, 'cliente': 'JFA - LSDH', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 615, 'status': 'J029'},
+        {'data': '2024-02-14', 'ano': 2024, 'cliente': 'Synertrading', 'categoria': 'Produto', 'tipo': 'Tambor fermentado', 'volume_impactado': 410, 'status': 'J110'},
+        
+        # 2023 - TUDO TRADUZIDO PARA PORTUGUÊS
+        {'data': '2023-12-15', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H097'},
+        {'data': '2023-11-22', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H078'},
+        {'data': '2023-10-18', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 410, 'status': 'H165'},
+        {'data': '2023-09-25', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 205, 'status': 'H062'},
+        {'data': '2023-08-30', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 0, 'status': 'H045'},
+        {'data': '2023-07-12', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Documentação', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H097'},
+        {'data': '2023-06-28', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H078'},
+        {'data': '2023-05-15', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 615, 'status': 'H165'},
+        {'data': '2023-04-20', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 410, 'status': 'H062'},
+        {'data': '2023-03-18', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 205, 'status': 'H045'},
+        {'data': '2023-02-22', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'H097'},
+        {'data': '2023-01-25', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H078'},
+        {'data': '2023-12-08', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H165'},
+        {'data': '2023-11-14', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 0, 'status': 'H062'},
+        {'data': '2023-10-05', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 410, 'status': 'H045'},
+        {'data': '2023-09-12', 'ano': 2023, 'cliente': 'Lassonde', 'categoria': 'Documentação', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'H097'},
+        {'data': '2023-08-18', 'ano': 2023, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 205, 'status': 'H078'},
+        {'data': '2023-07-25', 'ano': 2023, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 0, 'status': 'H165'},
+        {'data': '2023-06-30', 'ano': 2023, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 0, 'status': 'H062'},
+        {'data': '2023-05-22', 'ano': 2023, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 0, 'status': 'H045'},
+        
+        # 2022 - TUDO TRADUZIDO PARA PORTUGUÊS
+        {'data': '2022-12-15', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 1640, 'status': 'G097'},
+        {'data': '2022-11-20', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'G097'},
+        {'data': '2022-10-25', 'ano': 2022, 'cliente': 'Medibel', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'G078'},
+        {'data': '2022-09-14', 'ano': 2022, 'cliente': 'JFA - LSDH', 'categoria': 'Documentação', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'G029'},
+        {'data': '2022-08-30', 'ano': 2022, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 2460, 'status': 'G045'},
+        {'data': '2022-07-26', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 1640, 'status': 'G097'},
+        {'data': '2022-06-20', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'G097'},
+        {'data': '2022-12-08', 'ano': 2022, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 0, 'status': 'G078'},
+        {'data': '2022-11-15', 'ano': 2022, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 1025, 'status': 'G165'},
+        {'data': '2022-10-12', 'ano': 2022, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 410, 'status': 'G062'},
+        {'data': '2022-09-28', 'ano': 2022, 'cliente': 'Rauch', 'categoria': 'Produto', 'tipo': 'Organoléptico', 'volume_impactado': 0, 'status': 'G045'},
+        {'data': '2022-08-18', 'ano': 2022, 'cliente': 'Lassonde', 'categoria': 'Produto', 'tipo': 'Dano', 'volume_impactado': 1230, 'status': 'G097'},
+        {'data': '2022-07-22', 'ano': 2022, 'cliente': 'Boiron', 'categoria': 'Produto', 'tipo': 'Regulamentação', 'volume_impactado': 205, 'status': 'G078'},
+        {'data': '2022-06-30', 'ano': 2022, 'cliente': 'Antilles Glaces', 'categoria': 'Embalagem', 'tipo': 'Dano', 'volume_impactado': 820, 'status': 'G165'},
+        {'data': '2022-05-25', 'ano': 2022, 'cliente': 'Authentifruits', 'categoria': 'Produto', 'tipo': 'Fora de especificação', 'volume_impactado': 0, 'status': 'G062'},
+    ]
+    
+    df = pd.DataFrame(data)
+    df['data'] = pd.to_datetime(df['data'])
+    return compact_nc_data(df)
+
+
+def compact_nc_data(df):
+    """Converte textos em categóricas (dicionário único por coluna) e números em inteiros estreitos"""
+    df = df.reset_index(drop=True)
+    for coluna in CATEGORICAL_COLUMNS:
+        if not isinstance(df[coluna].dtype, pd.CategoricalDtype):
+            df[coluna] = df[coluna].astype('category')
+    df['ano'] = df['ano'].astype('int16')
+    volume = df['volume_impactado']
+    if (volume % 1 == 0).all():
+        df['volume_impactado'] = volume.astype('int32')
+    else:
+        df['volume_impactado'] = volume.astype('float32')
+    return df
+
+
+def column_by_name(nome):
+    """Coluna padronizada indicada só pelo nome do cabeçalho (None se nenhuma palavra casar)"""
+    nome = str(nome).lower()
+    return next((campo for campo, palavras in COLUMN_KEYWORDS.items() if any(p in nome for p in palavras)), None)
+
+
+def map_columns(colunas):
+    """Nome padronizado de cada coluna da planilha: as quatro primeiras pela posição, as demais pelo nome"""
+    column_mapping = {}
+    for i, col in enumerate(colunas):
+        col_lower = str(col).lower()
+        for campo, palavras in COLUMN_KEYWORDS.items():
+            # Mesma prioridade para posição e nome: "Data" na 3ª coluna ainda é a data
+            if (i < len(REQUIRED_COLUMNS) and REQUIRED_COLUMNS[i] == campo) or any(p in col_lower for p in palavras):
+                column_mapping[col] = campo
+                break
+    return column_mapping
+
+
+def infer_date_format(datas):
+    """Formato das datas em texto, deduzido da primeira data em texto (None se não houver)"""
+    # Células de data do Excel já chegam como datetime; só os textos dependem do formato
+    primeiro = next((valor for valor in datas if isinstance(valor, str) and valor.strip()), None)
+    if primeiro is None:
+        return None
+    with warnings.catch_warnings():
+        # O aviso de dayfirst não se aplica: o formato deduzido é passado explicitamente
+        warnings.simplefilter('ignore', UserWarning)
+        return guess_datetime_format(primeiro.strip())
+
+
+def clean_nc_data(df, regras=None, formato_data=None):
+    """Mapeia colunas, limpa e traduz uma planilha bruta de NCs"""
+    # Mapear colunas
+    df = df.rename(columns=map_columns(df.columns))
+    
+    # Processar dados: formato fixo, para '01/02/2024' não ser lido de um jeito em cada lote
+    formato_data = formato_data or infer_date_format(df['data'])
+    df['data'] = pd.to_datetime(df['data'], errors='coerce', format=formato_data)
+    df = df.dropna(subset=['data'])
+    df['ano'] = df['data'].dt.year
+    
+    # Limpar dados
+    if 'status' not in df:
+        df['status'] = 'N/A'
+    if 'volume_impactado' not in df:
+        df['volume_impactado'] = 0
+    for coluna in CATEGORICAL_COLUMNS:
+        df[coluna] = df[coluna].fillna('N/A').astype('category')
+    df['volume_impactado'] = pd.to_numeric(df['volume_impactado'], errors='coerce').fillna(0)
+    
+    # TRADUZIR E UNIFICAR (regras em data/normalizacao.json)
+    df = normalize_nc_data(df, regras or load_normalization_rules())
+    
+    return compact_nc_data(df)
+
+
+def iter_workbook_batches(fonte, tamanho_lote=STREAMING_BATCH_ROWS):
+    """Lê a planilha em modo somente leitura, entregando lotes de linhas como DataFrames"""
+    # Importado sob demanda: só a ingestão de planilhas precisa do openpyxl
+    import openpyxl
+    
+    workbook = openpyxl.load_workbook(fonte, read_only=True, data_only=True)
+    try:
+        # Primeira aba, como pd.read_excel e a validação (a aba ativa pode ser outra)
+        linhas = workbook.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = [col if col is not None else f"coluna_{i}" for i, col in enumerate(cabecalho)]
+        largura = len(colunas)
+        lote = []
+        for linha in linhas:
+            # Linhas podem vir mais curtas (células vazias no fim) ou mais longas que o cabeçalho
+            if len(linha) != largura:
+                linha = (tuple(linha) + (None,) * largura)[:largura]
+            lote.append(linha)
+            if len(lote) >= tamanho_lote:
+                yield pd.DataFrame.from_records(lote, columns=colunas)
+                lote = []
+        if lote:
+            yield pd.DataFrame.from_records(lote, columns=colunas)
+    finally:
+        workbook.close()
+
+
+def concat_nc_batches(lotes):
+    """Junta lotes já limpos unindo os dicionários das colunas categóricas"""
+    if not lotes:
+        raise ValueError("A planilha não contém linhas de dados")
+    df = pd.concat([lote.drop(columns=CATEGORICAL_COLUMNS) for lote in lotes], ignore_index=True)
+    for coluna in CATEGORICAL_COLUMNS:
+        df[coluna] = union_categoricals([lote[coluna] for lote in lotes])
+    return compact_nc_data(df[lotes[0].columns])
+
+
+def ingest_streaming(fonte, tamanho_lote=STREAMING_BATCH_ROWS):
+    """Ingestão em lotes: cada lote é mapeado, limpo e normalizado, e o cubo é acumulado"""
+    lotes = []
+    cubos = []
+    formato_data = None
+    for lote in iter_workbook_batches(fonte, tamanho_lote):
+        # Formato das datas decidido uma vez para a planilha toda, como na leitura de uma vez só
+        if formato_data is None:
+            formato_data = infer_date_format(lote.rename(columns=map_columns(lote.columns))['data'])
+        lote = clean_nc_data(lote, formato_data=formato_data)
+        lotes.append(lote)
+        cubos.append(aggregate_cube(lote))
+    df = concat_nc_batches(lotes)
+    return df, merge_cubes(cubos, df)
+
+
+def use_streaming(nome_arquivo, tamanho_bytes):
+    """Planilhas .xlsx grandes são lidas em lotes; .xls e arquivos pequenos de uma vez"""
+    return str(nome_arquivo).lower().endswith('.xlsx') and tamanho_bytes >= STREAMING_THRESHOLD_BYTES
+
+
+def ingest_workbook(fonte, streaming=False):
+    """Lê, limpa e agrega uma planilha, retornando (df, cubo)"""
+    if streaming:
+        return ingest_streaming(fonte)
+    df = clean_nc_data(pd.read_excel(fonte, header=0))
+    return df, aggregate_cube(df)
+
+
+def _ingest_source(tarefa):
+    """Processo do pool: lê e limpa uma planilha (caminho ou bytes) como em ingest_workbook"""
+    origem, fonte = tarefa
+    if isinstance(fonte, bytes):
+        tamanho = len(fonte)
+        fonte = io.BytesIO(fonte)
+    else:
+        tamanho = Path(fonte).stat().st_size
+    return ingest_workbook(fonte, use_streaming(origem, tamanho))
+
+
+def _pool_context():
+    """forkserver quando disponível: o servidor do Streamlit tem várias threads e fork direto não é seguro"""
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+    if 'forkserver' in metodos:
+        # Os processos já nascem com pandas e o kmais importados
+        contexto.set_forkserver_preload(['kmais.ingest'])
+    return contexto
+
+
+def merge_sources(origens, partes, deduplicar=True):
+    """Junta planilhas já limpas numa base só, com a coluna categórica 'origem'.
+    
+    Com deduplicar, um registro (chave data + cliente + status + tipo) que já veio
+    de uma planilha anterior da lista é descartado; repetições dentro da mesma
+    planilha são mantidas, como na ingestão de um arquivo só.
+    """
+    dfs = [df for df, _ in partes]
+    df = concat_nc_batches(dfs)
+    # Nomes repetidos (mesmo arquivo em pastas diferentes) compartilham a categoria
+    categorias = list(dict.fromkeys(origens))
+    codigos = np.repeat([categorias.index(origem) for origem in origens], [len(parte) for parte in dfs])
+    df['origem'] = pd.Categorical.from_codes(codigos, categories=categorias)
+    
+    if deduplicar and len(partes) > 1:
+        indice_parte = np.repeat(np.arange(len(dfs)), [len(parte) for parte in dfs])
+        primeira_parte = pd.Series(indice_parte).groupby(record_key_hashes(df)).transform('min').to_numpy()
+        manter = indice_parte == primeira_parte
+        if not manter.all():
+            df = df[manter].reset_index(drop=True)
+            return df, aggregate_cube(df)
+    return df, merge_cubes([cubo for _, cubo in partes], df)
+
+
+def ingest_workbooks(fontes, processos=None, deduplicar=True):
+    """Lê várias planilhas em paralelo e as consolida, retornando (df, cubo).
+    
+    fontes é uma lista de (origem, caminho ou bytes); cada planilha passa pela
+    mesma limpeza de ingest_workbook num processo separado, então o tempo total
+    fica próximo ao da maior planilha e não à soma de todas.
+    """
+    if not fontes:
+        raise ValueError("Nenhuma planilha informada")
+    if len(fontes) == 1 or processos == 1:
+        partes = [_ingest_source(fonte) for fonte in fontes]
+    else:
+        trabalhadores = min(len(fontes), processos or multiprocessing.cpu_count())
+        with ProcessPoolExecutor(max_workers=trabalhadores, mp_context=_pool_context()) as pool:
+            partes = list(pool.map(_ingest_source, fontes))
+    return merge_sources([origem for origem, _ in fontes], partes, deduplicar)
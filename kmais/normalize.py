@@ -0,0 +1,84 @@
+"""Tradução e unificação dos valores categóricos pelas regras de data/normalizacao.json"""
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from kmais.constants import CATEGORICAL_COLUMNS, NORMALIZATION_RULES_PATH
+
+
+def _normalization_key(valor):
+    """Chave de comparação tolerante a maiúsculas/minúsculas e espaços extras"""
+    return ' '.join(str(valor).split()).casefold()
+
+
+def load_normalization_rules(path=str(NORMALIZATION_RULES_PATH)):
+    """Regras de normalização do arquivo, recarregadas quando ele é alterado (sem reiniciar o app)"""
+    # Um stat por chamada: o arquivo só é relido e recompilado quando o mtime muda
+    return _compile_normalization_rules(path, os.stat(path).st_mtime_ns)
+
+
+@lru_cache(maxsize=4)
+def _compile_normalization_rules(path, mtime):
+    """Carrega o arquivo versionado de regras e pré-compila os casamentos por prefixo"""
+    with open(path, encoding='utf-8') as arquivo:
+        config = json.load(arquivo)
+    
+    colunas = {}
+    for coluna, regra in config['regras'].items():
+        # Prefixos mais longos primeiro: a alternância do regex para no primeiro que casar
+        prefixos = sorted(regra.get('prefixos', {}).items(), key=lambda item: len(item[0]), reverse=True)
+        padrao = None
+        if prefixos:
+            padrao = re.compile('|'.join(
+                f"(?P<p{i}>{re.escape(_normalization_key(prefixo))})"
+                for i, (prefixo, _) in enumerate(prefixos)
+            ))
+        colunas[coluna] = {
+            'exatas': {_normalization_key(k): v for k, v in regra.get('exatas', {}).items()},
+            'padrao': padrao,
+            'destinos': [destino for _, destino in prefixos]
+        }
+    return {'versao': config['versao'], 'colunas': colunas}
+
+
+def _translate_value(valor, regra):
+    """Aplica as regras a um único valor distinto"""
+    texto = ' '.join(str(valor).split())
+    if regra is None:
+        return texto
+    chave = _normalization_key(texto)
+    if chave in regra['exatas']:
+        return regra['exatas'][chave]
+    if regra['padrao'] is not None:
+        casamento = regra['padrao'].match(chave)
+        if casamento:
+            return regra['destinos'][int(casamento.lastgroup[1:])]
+    return texto
+
+
+def normalize_column(serie, regra=None):
+    """Traduz cada categoria distinta uma única vez e recodifica a coluna pelos códigos"""
+    categorias = serie.cat.categories
+    traduzidas = [_translate_value(valor, regra) for valor in categorias]
+    if traduzidas == list(categorias):
+        return serie
+    # Categorias que viram o mesmo texto passam a compartilhar o mesmo código
+    novos_codigos, novas_categorias = pd.factorize(pd.Index(traduzidas))
+    codigos = serie.cat.codes.to_numpy()
+    codigos = np.where(codigos >= 0, novos_codigos[codigos], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(codigos, categories=novas_categorias),
+        index=serie.index,
+        name=serie.name
+    )
+
+
+def normalize_nc_data(df, regras):
+    """Aplica o motor de normalização a todas as colunas categóricas"""
+    for coluna in CATEGORICAL_COLUMNS:
+        df[coluna] = normalize_column(df[coluna], regras['colunas'].get(coluna))
+    return df
@@ -0,0 +1,95 @@
+"""Registro de versões dos dados compartilhado entre sessões do mesmo processo"""
+import threading
+from collections import OrderedDict
+
+
+class DatasetRegistry:
+    """Registro do processo: cada versão dos dados fica uma única vez em memória, compartilhada
+    entre as sessões, que guardam apenas a versão em uso"""
+    
+    def __init__(self, max_bytes, max_ociosas, sessao_ativa=None):
+        self.max_bytes = max_bytes
+        self.max_ociosas = max_ociosas
+        # Sessões encerradas deixam de segurar versões (sem callback, todas contam como ativas)
+        self.sessao_ativa = sessao_ativa or (lambda sessao: True)
+        self._trava = threading.RLock()
+        self._carregando = {}
+        self._entradas = OrderedDict()
+        self._sessoes = {}
+    
+    def get(self, versao_dados, carregar=None):
+        """Retorna o df da versão, carregando-o uma única vez mesmo com sessões concorrentes"""
+        with self._trava:
+            entrada = self._entradas.get(versao_dados)
+            if entrada is not None:
+                self._entradas.move_to_end(versao_dados)
+                return entrada['df']
+            if carregar is None:
+                return None
+            trava_versao = self._carregando.setdefault(versao_dados, threading.Lock())
+        
+        with trava_versao:
+            try:
+                # Outra sessão pode ter terminado a carga enquanto esta esperava
+                df = self.get(versao_dados)
+                if df is None:
+                    df = self.put(versao_dados, carregar())
+            finally:
+                with self._trava:
+                    self._carregando.pop(versao_dados, None)
+        return df
+    
+    def put(self, versao_dados, df):
+        """Registra uma versão já montada (a primeira registrada prevalece)"""
+        with self._trava:
+            entrada = self._entradas.get(versao_dados)
+            if entrada is not None:
+                return entrada['df']
+            self._entradas[versao_dados] = {
+                'df': df,
+                'bytes': int(df.memory_usage(deep=True).sum()),
+                'sessoes': set()
+            }
+            # A versão recém-registrada ainda não tem sessão, mas quem a pediu vai usá-la agora
+            self._evict(preservar=versao_dados)
+            return df
+    
+    def acquire(self, sessao, versao_dados):
+        """Marca a versão em uso pela sessão, liberando a que ela usava antes"""
+        with self._trava:
+            anterior = self._sessoes.get(sessao)
+            if anterior == versao_dados:
+                return
+            if anterior in self._entradas:
+                self._entradas[anterior]['sessoes'].discard(sessao)
+            self._sessoes[sessao] = versao_dados
+            if versao_dados in self._entradas:
+                self._entradas[versao_dados]['sessoes'].add(sessao)
+            self._evict()
+    
+    def _evict(self, preservar=None):
+        """Libera sessões encerradas e descarta versões sem uso (LRU) acima dos limites, menos `preservar`"""
+        for sessao in [sessao for sessao in self._sessoes if not self.sessao_ativa(sessao)]:
+            versao_dados = self._sessoes.pop(sessao)
+            if versao_dados in self._entradas:
+                self._entradas[versao_dados]['sessoes'].discard(sessao)
+        
+        total = sum(entrada['bytes'] for entrada in self._entradas.values())
+        ociosas = [versao for versao, entrada in self._entradas.items() if not entrada['sessoes'] and versao != preservar]
+        while ociosas and (total > self.max_bytes or len(ociosas) > self.max_ociosas):
+            versao_dados = ociosas.pop(0)
+            total -= self._entradas.pop(versao_dados)['bytes']
+    
+    def versions(self):
+        """Versões dos dados atualmente em memória"""
+        with self._trava:
+            return list(self._entradas)
+    
+    def stats(self):
+        """Resumo para o sidebar: versões, sessões e memória ocupada"""
+        with self._trava:
+            return {
+                'versoes': len(self._entradas),
+                'sessoes': len(self._sessoes),
+                'bytes': sum(entrada['bytes'] for entrada in self._entradas.values())
+            }
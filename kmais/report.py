@@ -0,0 +1,288 @@
+"""Relatórios HTML estáticos do dashboard, gerados em lote fora do Streamlit.
+
+Uso (a partir da raiz do repositório):
+    python -m kmais.report                                   # todas as planilhas de data/
+    python -m kmais.report data/NCKmais_2022_2025.xlsx --por ano cliente
+    python -m kmais.report pasta/com/planilhas --saida relatorios --processos 4
+
+Para cada planilha são gerados um relatório geral e um por ano, cliente e
+categoria (ou só as dimensões de --por), com os mesmos KPIs e gráficos do
+dashboard. Os relatórios são renderizados em paralelo num pool de processos
+e ficam em <saida>/<planilha>/, com um index.html e uma única cópia do
+plotly.min.js compartilhada por todos (abrem sem internet).
+"""
+import argparse
+import html
+import os
+import re
+import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from kmais.aggregate import aggregate_cube, annual_evolution, kpi_summary, rollup_cube, slice_cube
+from kmais.charts import CHART_BUILDERS
+from kmais.constants import DATA_DIR
+from kmais.ingest import ingest_workbook
+from kmais.snapshots import load_source_frame
+
+RELATORIOS_DIR = Path(__file__).resolve().parent.parent / 'relatorios'
+REPORT_DIMENSIONS = ['ano', 'cliente', 'categoria']
+
+ROTULOS_DIMENSAO = {'ano': 'Ano', 'cliente': 'Cliente', 'categoria': 'Categoria'}
+
+ESTILO = """
+    body { font-family: "Source Sans Pro", Arial, sans-serif; margin: 0 auto; padding: 1rem 2rem; max-width: 1400px; color: #262730; }
+    .header-container { background: linear-gradient(135deg, #E30613, #C41E3A); color: white; padding: 1.5rem; border-radius: 10px; text-align: center; margin-bottom: 2rem; }
+    .header-title { font-size: 2.5rem; font-weight: bold; margin-bottom: 0.5rem; }
+    .header-subtitle { font-size: 1.2rem; opacity: 0.9; }
+    .linha { display: grid; grid-template-columns: repeat(auto-fit, minmax(240px, 1fr)); gap: 1rem; }
+    .graficos { grid-template-columns: repeat(auto-fit, minmax(480px, 1fr)); }
+    .kpi-card { background: white; padding: 1.5rem; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); border-left: 4px solid #E30613; text-align: center; margin-bottom: 1rem; }
+    .kpi-title { font-size: 0.9rem; color: #666; margin-bottom: 0.5rem; }
+    .kpi-value { font-size: 2.5rem; font-weight: bold; color: #E30613; margin-bottom: 0.2rem; }
+    .kpi-subtitle { font-size: 0.8rem; color: #999; }
+    table.tabela { border-collapse: collapse; width: 100%; }
+    table.tabela th, table.tabela td { border-bottom: 1px solid #eee; padding: 0.4rem 0.6rem; text-align: right; }
+    table.tabela th:first-child, table.tabela td:first-child { text-align: left; }
+    .vazio { color: #666; background: #e8f4fd; padding: 1rem; border-radius: 6px; }
+    footer { color: #999; font-size: 0.8rem; margin-top: 2rem; }
+"""
+
+
+def kpi_cards_html(cubo, selecoes, kpis=None):
+    """Os quatro cards de KPI do dashboard (total, período, volume e tendência) em HTML"""
+    anos_selecionados = selecoes['ano']
+    if kpis is None:
+        kpis = kpi_summary(cubo, selecoes)
+    
+    # Tendência entre o primeiro e o último ano escolhidos
+    tendencia = kpis['tendencia']
+    if tendencia is not None:
+        tendencia_text = f"{tendencia:+.1f}%"
+        tendencia_color = "green" if tendencia < 0 else "red"
+    else:
+        tendencia_text = "N/A"
+        tendencia_color = "gray"
+    
+    periodo_text = "Todos os Anos" if not anos_selecionados else f"Anos {', '.join(map(str, sorted(anos_selecionados)))}"
+    
+    return [
+        f"""<div class="kpi-card">
+    <div class="kpi-title">Total de NCs</div>
+    <div class="kpi-value">{kpis['total_ncs']}</div>
+</div>""",
+        f"""<div class="kpi-card">
+    <div class="kpi-title">Período</div>
+    <div class="kpi-value" style="font-size: 1.5rem;">{periodo_text}</div>
+</div>""",
+        f"""<div class="kpi-card">
+    <div class="kpi-title">Volume Impactado</div>
+    <div class="kpi-value">{kpis['volume_total']/1000:.1f}</div>
+    <div class="kpi-subtitle">toneladas</div>
+</div>""",
+        f"""<div class="kpi-card">
+    <div class="kpi-title">Tendência</div>
+    <div class="kpi-value" style="color: {tendencia_color};">{tendencia_text}</div>
+</div>"""
+    ]
+
+
+def _slug(texto):
+    """Nome de arquivo ASCII a partir de um valor de dimensão"""
+    ascii_ = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode()
+    return re.sub(r'[^a-z0-9]+', '-', ascii_.lower()).strip('-') or 'vazio'
+
+
+def _unique_slug(texto, usados):
+    """_slug que não repete os de `usados` (valores que só diferem em acentos ou pontuação ganham -2, -3...)"""
+    base = slug = _slug(texto)
+    sufixo = 1
+    while slug in usados:
+        sufixo += 1
+        slug = f"{base}-{sufixo}"
+    usados.add(slug)
+    return slug
+
+
+def report_selections(cubo, dimensoes=REPORT_DIMENSIONS):
+    """Relatórios de uma planilha: (arquivo, título, seleções) para o geral e cada valor das dimensões"""
+    anos = sorted(int(ano) for ano in cubo['ano'].unique())
+    base = {'ano': anos, 'cliente': [], 'categoria': []}
+    relatorios = [('geral.html', 'Visão geral', base)]
+    for dimensao in dimensoes:
+        if dimensao == 'ano':
+            valores = anos
+        else:
+            valores = list(rollup_cube(cubo, dimensao).index)
+        usados = set()
+        for valor in valores:
+            # Relatórios de cliente/categoria mantêm todos os anos, como o filtro padrão do dashboard
+            selecoes = dict(base, **{dimensao: [valor]})
+            relatorios.append((
+                f"{dimensao}-{_unique_slug(valor, usados)}.html",
+                f"{ROTULOS_DIMENSAO[dimensao]}: {valor}",
+                selecoes
+            ))
+    return relatorios
+
+
+def _figure_html(grafico, dados):
+    """Figura do dashboard como fragmento HTML (o plotly.min.js é carregado uma vez pela página)"""
+    if dados.empty:
+        return '<p class="vazio">Nenhum dado disponível</p>'
+    fig = CHART_BUILDERS[grafico](dados)
+    return fig.to_html(full_html=False, include_plotlyjs=False, config={'displaylogo': False})
+
+
+def _table_html(agregado, total):
+    """Tabela da Análise Horizontal (NCs, % do total e volume)"""
+    if total <= 0:
+        return '<p class="vazio">Nenhum dado disponível</p>'
+    tabela = agregado.copy()
+    tabela['percentual'] = (tabela['ncs'] / total * 100).round(1)
+    tabela['volume_kg'] = tabela['volume_impactado'].round(0)
+    return tabela[['ncs', 'percentual', 'volume_kg']].rename(columns={
+        'ncs': 'NCs',
+        'percentual': '% Total',
+        'volume_kg': 'Volume (kg)'
+    }).to_html(classes='tabela', border=0)
+
+
+def render_report(destino, fonte, titulo, cubo, selecoes):
+    """Gera um relatório HTML com os KPIs, gráficos e tabelas do dashboard para as seleções"""
+    cubo_filtrado = slice_cube(cubo, selecoes)
+    total = int(cubo_filtrado['ncs'].sum())
+    evolucao = annual_evolution(cubo, selecoes)
+    clientes = rollup_cube(cubo_filtrado, 'cliente', top=10)
+    
+    graficos = [
+        ("📈 Evolução Anual", 'evolucao_ncs', evolucao),
+        ("📊 Volume Impactado por Ano", 'evolucao_volume', evolucao),
+        ("👥 Top 10 Clientes", 'top_clientes', clientes),
+        ("🏷️ Categorias de NC", 'categorias', rollup_cube(cubo_filtrado, 'categoria'))
+    ]
+    secoes_graficos = ''.join(
+        f"<section><h3>{subtitulo}</h3>{_figure_html(grafico, dados)}</section>"
+        for subtitulo, grafico, dados in graficos
+    )
+    
+    pagina = f"""<!DOCTYPE html>
+<html lang="pt-BR">
+<head>
+<meta charset="utf-8">
+<title>KMAIS - {html.escape(titulo)}</title>
+<script src="plotly.min.js"></script>
+<style>{ESTILO}</style>
+</head>
+<body>
+<div class="header-container">
+    <div class="header-title">🏭 Relatório KMAIS</div>
+    <div class="header-subtitle">{html.escape(titulo)} · {html.escape(fonte)}</div>
+</div>
+<div class="linha">{''.join(kpi_cards_html(cubo, selecoes))}</div>
+<h2>📊 Análise Visual</h2>
+<div class="linha graficos">{secoes_graficos}</div>
+<h2>📈 Análise Horizontal</h2>
+<div class="linha graficos">
+<section><h3>👥 Principais Clientes</h3>{_table_html(clientes, total)}</section>
+<section><h3>🔧 Principais Tipos</h3>{_table_html(rollup_cube(cubo_filtrado, 'tipo', top=10), total)}</section>
+</div>
+<footer>Gerado em {time.strftime('%d/%m/%Y %H:%M')} · <a href="index.html">todos os relatórios</a></footer>
+</body>
+</html>
+"""
+    Path(destino).write_text(pagina, encoding='utf-8')
+    return destino
+
+
+def _render_task(tarefa):
+    """Ponto de entrada dos processos do pool"""
+    return render_report(*tarefa)
+
+
+def load_workbook_cube(caminho):
+    """Cubo de uma planilha: fontes de data/ usam o snapshot (e acréscimos) do dashboard"""
+    caminho = Path(caminho).resolve()
+    if caminho.parent == DATA_DIR.resolve():
+        return aggregate_cube(load_source_frame(caminho.name))
+    _, cubo = ingest_workbook(str(caminho))
+    return cubo
+
+
+def _write_support_files(pasta, fonte, relatorios):
+    """plotly.min.js compartilhado e índice com os relatórios da planilha"""
+    from plotly.offline import get_plotlyjs
+    
+    pasta.mkdir(parents=True, exist_ok=True)
+    (pasta / 'plotly.min.js').write_text(get_plotlyjs(), encoding='utf-8')
+    itens = ''.join(
+        f'<li><a href="{arquivo}">{html.escape(titulo)}</a></li>'
+        for arquivo, titulo, _ in relatorios
+    )
+    (pasta / 'index.html').write_text(
+        f"""<!DOCTYPE html>
+<html lang="pt-BR"><head><meta charset="utf-8"><title>Relatórios KMAIS - {html.escape(fonte)}</title></head>
+<body><h1>Relatórios KMAIS - {html.escape(fonte)}</h1><ul>{itens}</ul></body></html>
+""",
+        encoding='utf-8'
+    )
+
+
+def list_sources(caminhos):
+    """Planilhas de entrada: arquivos informados ou os .xlsx/.xls de cada diretório"""
+    fontes = []
+    for caminho in map(Path, caminhos):
+        if caminho.is_dir():
+            fontes.extend(sorted(p for p in caminho.iterdir() if p.suffix.lower() in ('.xlsx', '.xls')))
+        else:
+            fontes.append(caminho)
+    return fontes
+
+
+def generate_reports(fontes, saida=RELATORIOS_DIR, dimensoes=REPORT_DIMENSIONS, processos=None):
+    """Gera os relatórios de todas as planilhas, renderizando-os em paralelo"""
+    tarefas = []
+    pastas = set()
+    for fonte in fontes:
+        cubo = load_workbook_cube(fonte)
+        pasta = Path(saida) / _unique_slug(Path(fonte).stem, pastas)
+        relatorios = report_selections(cubo, dimensoes)
+        _write_support_files(pasta, Path(fonte).name, relatorios)
+        tarefas.extend(
+            (str(pasta / arquivo), Path(fonte).name, titulo, cubo, selecoes)
+            for arquivo, titulo, selecoes in relatorios
+        )
+    
+    if processos == 1:
+        return [_render_task(tarefa) for tarefa in tarefas]
+    with ProcessPoolExecutor(max_workers=processos) as pool:
+        # Lotes maiores reduzem o custo de enviar o cubo a cada processo
+        lote = max(1, len(tarefas) // (4 * (processos or os.cpu_count() or 1)))
+        return list(pool.map(_render_task, tarefas, chunksize=lote))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera relatórios HTML estáticos do dashboard KMAIS")
+    parser.add_argument('fontes', nargs='*', default=[str(DATA_DIR)],
+                        help="Planilhas ou diretórios de planilhas (padrão: data/)")
+    parser.add_argument('--saida', default=str(RELATORIOS_DIR), help="Diretório dos relatórios (padrão: relatorios/)")
+    parser.add_argument('--por', nargs='*', choices=REPORT_DIMENSIONS, default=REPORT_DIMENSIONS,
+                        help="Dimensões com um relatório por valor (além do geral)")
+    parser.add_argument('--processos', type=int, default=None,
+                        help="Processos de renderização (padrão: número de CPUs; 1 = sem pool)")
+    args = parser.parse_args(argv)
+    
+    fontes = list_sources(args.fontes)
+    if not fontes:
+        print("Nenhuma planilha encontrada", file=sys.stderr)
+        return 1
+    inicio = time.perf_counter()
+    gerados = generate_reports(fontes, args.saida, args.por, args.processos)
+    print(f"{len(gerados)} relatórios de {len(fontes)} planilha(s) em {time.perf_counter() - inicio:.1f} s → {args.saida}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
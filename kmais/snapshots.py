@@ -0,0 +1,111 @@
+"""Fontes de dados em data/: snapshots Arrow/Feather das planilhas e acréscimos incrementais"""
+import threading
+from pathlib import Path
+
+from kmais.aggregate import new_record_mask, record_key_hashes, sorted_key_hashes
+from kmais.constants import DATA_DIR, FONTE_PADRAO, SNAPSHOT_DIR
+from kmais.ingest import compact_nc_data, concat_nc_batches, ingest_workbook, load_default_data, use_streaming
+from kmais.normalize import load_normalization_rules, normalize_nc_data
+
+# Numeração dos acréscimos: listar e gravar juntos, para duas gravações não ficarem com o mesmo número
+_DELTA_LOCK = threading.Lock()
+
+
+def snapshot_path(workbook_path, versao_regras):
+    """Caminho do snapshot colunar correspondente a uma planilha de data/"""
+    return SNAPSHOT_DIR / f"{Path(workbook_path).stem}.r{versao_regras}.feather"
+
+
+def build_snapshot(workbook_path):
+    """Converte a planilha uma única vez em snapshot Arrow/Feather sem compressão"""
+    from pyarrow import feather
+    
+    streaming = use_streaming(workbook_path, Path(workbook_path).stat().st_size)
+    df, _ = ingest_workbook(workbook_path, streaming)
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    destino = snapshot_path(workbook_path, load_normalization_rules()['versao'])
+    temporario = destino.with_suffix('.tmp')
+    # Sem compressão para que o arquivo possa ser mapeado em memória
+    feather.write_feather(df, temporario, compression='uncompressed')
+    temporario.replace(destino)
+    return destino
+
+
+def load_snapshot(path):
+    """Lê o snapshot via memory-map, sem reprocessar a planilha"""
+    from pyarrow import feather
+    
+    return compact_nc_data(feather.read_table(path, memory_map=True).to_pandas())
+
+
+def list_workbooks():
+    """Planilhas disponíveis em data/"""
+    return sorted(DATA_DIR.glob('*.xlsx'))
+
+
+def _delta_prefix(fonte):
+    """Prefixo dos arquivos de acréscimo incremental de uma fonte (independe da versão das regras)"""
+    if fonte == FONTE_PADRAO:
+        return 'padrao'
+    return Path(fonte).stem
+
+
+def list_delta_snapshots(fonte):
+    """Acréscimos gravados para a fonte, em ordem de gravação"""
+    prefixo = _delta_prefix(fonte)
+    # Acréscimos antigos traziam a versão das regras no nome (planilha.rN.delta-*) e vêm antes
+    antigos = sorted(SNAPSHOT_DIR.glob(f"{prefixo}.r*.delta-*.feather")) if fonte != FONTE_PADRAO else []
+    return antigos + sorted(SNAPSHOT_DIR.glob(f"{prefixo}.delta-*.feather"))
+
+
+def save_delta_snapshot(fonte, novos):
+    """Grava apenas as linhas novas como mais uma parte do snapshot da fonte; retorna as partes até ela"""
+    from pyarrow import feather
+    
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    with _DELTA_LOCK:
+        partes = list_delta_snapshots(fonte)
+        destino = SNAPSHOT_DIR / f"{_delta_prefix(fonte)}.delta-{len(partes) + 1:04d}.feather"
+        temporario = destino.with_suffix('.tmp')
+        feather.write_feather(novos.reset_index(drop=True), temporario, compression='uncompressed')
+        temporario.replace(destino)
+    return partes + [destino]
+
+
+def load_workbook_data(workbook_path, workbook_mtime, versao_regras):
+    """Carrega uma planilha de data/ pelo snapshot, gerando-o se estiver desatualizado"""
+    snapshot = snapshot_path(workbook_path, versao_regras)
+    if not snapshot.exists() or snapshot.stat().st_mtime < workbook_mtime:
+        build_snapshot(workbook_path)
+    return load_snapshot(snapshot)
+
+
+def load_source_frame(fonte, partes=None):
+    """Lê a fonte (dados padrão ou snapshot da planilha) e aplica os acréscimos gravados"""
+    if partes is None:
+        partes = list_delta_snapshots(fonte)
+    if fonte == FONTE_PADRAO:
+        df = load_default_data()
+    else:
+        workbook_path = DATA_DIR / fonte
+        versao_regras = load_normalization_rules()['versao']
+        df = load_workbook_data(str(workbook_path), workbook_path.stat().st_mtime, versao_regras)
+    if partes:
+        # Acréscimos nunca são apagados: se a planilha passou a conter um registro (exportação
+        # completa mais nova), vale o da planilha e o do acréscimo é ignorado
+        acrescimos = concat_nc_batches([load_snapshot(parte) for parte in partes])
+        # Gravados com as regras da época: reaplicar as atuais traduz o que elas passaram a cobrir
+        acrescimos = compact_nc_data(normalize_nc_data(acrescimos, load_normalization_rules()))
+        acrescimos = acrescimos[new_record_mask(sorted_key_hashes(df), record_key_hashes(acrescimos))]
+        df = concat_nc_batches([df, acrescimos])
+    return df
+
+
+def source_version(fonte, acrescimos=0):
+    """Versão dos dados de uma fonte: planilha + mtime + regras + número de acréscimos"""
+    if fonte == FONTE_PADRAO:
+        versao_dados = 'padrao'
+    else:
+        workbook_mtime = (DATA_DIR / fonte).stat().st_mtime
+        versao_dados = f"{fonte}:{workbook_mtime}:r{load_normalization_rules()['versao']}"
+    return f"{versao_dados}:d{acrescimos}" if acrescimos else versao_dados
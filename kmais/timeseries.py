@@ -0,0 +1,84 @@
+"""Séries temporais mensais e semanais de NCs e volume, com janelas móveis e comparação anual"""
+import numpy as np
+import pandas as pd
+
+from kmais.aggregate import summable_volume
+
+# Granularidades: frequência do pandas e períodos por ano (defasagem do comparativo anual)
+GRANULARITIES = {
+    'mensal': {'frequencia': 'MS', 'periodos_ano': 12, 'rotulo': 'mês', 'plural': 'meses', 'ultimo': 'Último mês'},
+    'semanal': {'frequencia': 'W-MON', 'periodos_ano': 52, 'rotulo': 'semana', 'plural': 'semanas', 'ultimo': 'Última semana'}
+}
+
+# Janelas móveis oferecidas para cada granularidade (em períodos)
+ROLLING_WINDOWS = {'mensal': [3, 6, 12], 'semanal': [4, 8, 13, 26]}
+
+TIME_DIMENSIONS = ['periodo', 'cliente', 'categoria', 'tipo']
+METRICS = ['ncs', 'volume_impactado']
+
+
+def period_start(datas, granularidade):
+    """Início do período de cada data: 1º dia do mês ou segunda-feira da semana"""
+    dias = datas.to_numpy().astype('datetime64[D]')
+    if granularidade == 'mensal':
+        inicio = dias.astype('datetime64[M]')
+    else:
+        # 1970-01-01 foi uma quinta-feira: (dias + 3) % 7 é o dia da semana com segunda = 0
+        numeros = dias.astype('i8')
+        inicio = (numeros - (numeros + 3) % 7).astype('datetime64[D]')
+    return inicio.astype('datetime64[ns]')
+
+
+def build_time_cube(df, granularidade):
+    """NCs e volume por (período, cliente, categoria, tipo) na granularidade pedida"""
+    periodo = pd.Series(period_start(df['data'], granularidade), index=df.index, name='periodo')
+    df = df.assign(volume_impactado=summable_volume(df['volume_impactado']))
+    return df.groupby([periodo, *TIME_DIMENSIONS[1:]], observed=True).agg(
+        ncs=('data', 'size'),
+        volume_impactado=('volume_impactado', 'sum')
+    ).reset_index()
+
+
+def slice_time_cube(cubo_temporal, selecoes, ignorar=()):
+    """Recorta o cubo temporal pelas seleções (o ano vem do período; listas vazias não filtram)"""
+    mascara = np.ones(len(cubo_temporal), dtype=bool)
+    for dimensao in TIME_DIMENSIONS[1:]:
+        valores = selecoes.get(dimensao)
+        if valores and dimensao not in ignorar:
+            mascara &= cubo_temporal[dimensao].isin(valores).to_numpy()
+    anos = selecoes.get('ano')
+    if anos and 'ano' not in ignorar:
+        mascara &= cubo_temporal['periodo'].dt.year.isin(anos).to_numpy()
+    return cubo_temporal[mascara]
+
+
+def time_series(cubo_temporal, selecoes, granularidade, janela):
+    """Série por período com soma e média móveis e variação anual, respeitando os filtros.
+
+    Janelas e defasagens são calculadas sobre todos os anos (com períodos sem NC
+    valendo zero) e só então a série é recortada nos anos escolhidos, para que
+    o primeiro mês de um ano ainda compare com o mesmo mês do ano anterior.
+    """
+    config = GRANULARITIES[granularidade]
+    if cubo_temporal.empty:
+        return pd.DataFrame(columns=['periodo'] + METRICS)
+    
+    recorte = slice_time_cube(cubo_temporal, selecoes, ignorar=('ano',))
+    recorte = recorte.assign(volume_impactado=summable_volume(recorte['volume_impactado']))
+    serie = recorte.groupby('periodo')[METRICS].sum()
+    periodos = pd.date_range(cubo_temporal['periodo'].min(), cubo_temporal['periodo'].max(), freq=config['frequencia'])
+    serie = serie.reindex(periodos, fill_value=0)
+    serie.index.name = 'periodo'
+    
+    for metrica in METRICS:
+        janela_movel = serie[metrica].rolling(janela, min_periods=1)
+        serie[f'{metrica}_acumulado'] = janela_movel.sum()
+        serie[f'{metrica}_media'] = janela_movel.mean()
+        anterior = serie[metrica].shift(config['periodos_ano'])
+        serie[f'{metrica}_yoy'] = serie[metrica] - anterior
+        serie[f'{metrica}_yoy_pct'] = serie[f'{metrica}_yoy'] / anterior.where(anterior > 0) * 100
+    
+    anos = selecoes.get('ano')
+    if anos:
+        serie = serie[serie.index.year.isin(anos)]
+    return serie.reset_index()
@@ -0,0 +1,129 @@
+"""Validação rápida de planilhas de NC pelo cabeçalho e por uma amostra de linhas, antes da ingestão.
+
+Planilhas com colunas ausentes ou fora de lugar, ou sem datas legíveis, são
+recusadas sem ler o arquivo inteiro e sem chegar aos caches de dados; o que a
+ingestão tolera (datas inválidas isoladas, volumes não numéricos, categorias
+nunca vistas) vira aviso.
+"""
+import io
+
+import pandas as pd
+
+from kmais.constants import REQUIRED_COLUMNS, VALIDATION_MIN_DATE_RATIO, VALIDATION_SAMPLE_ROWS
+from kmais.ingest import column_by_name, infer_date_format, map_columns
+from kmais.normalize import load_normalization_rules, normalize_column
+
+# Colunas comparadas com as categorias já conhecidas (clientes e status novos são esperados)
+KNOWN_CATEGORY_COLUMNS = ['categoria', 'tipo']
+UNKNOWN_VALUES_SHOWN = 5
+
+
+def read_sample(fonte, linhas=VALIDATION_SAMPLE_ROWS):
+    """Cabeçalho e primeiras `linhas` linhas da planilha (a leitura para ali, sem percorrer o resto)"""
+    if isinstance(fonte, bytes):
+        fonte = io.BytesIO(fonte)
+    return pd.read_excel(fonte, header=0, nrows=linhas)
+
+
+def known_categories(df, colunas=KNOWN_CATEGORY_COLUMNS):
+    """Valores já conhecidos de cada coluna categórica de uma base carregada"""
+    return {coluna: set(df[coluna].cat.categories) for coluna in colunas}
+
+
+def check_columns(colunas):
+    """Mapeamento do cabeçalho e erros: coluna obrigatória ausente, repetida ou lida no lugar de outra"""
+    mapeamento = map_columns(colunas)
+    erros = []
+    por_campo = {}
+    for coluna, campo in mapeamento.items():
+        por_campo.setdefault(campo, []).append(str(coluna))
+    
+    for campo in REQUIRED_COLUMNS:
+        if campo not in por_campo:
+            erros.append(f"Coluna obrigatória ausente: {campo}")
+    for campo, originais in por_campo.items():
+        if len(originais) > 1:
+            erros.append(f"As colunas {', '.join(originais)} seriam todas lidas como {campo}")
+    # As quatro primeiras colunas valem pela posição: um nome que indica outra coluna é sinal de ordem trocada
+    for posicao, coluna in enumerate(colunas, start=1):
+        pelo_nome = column_by_name(coluna)
+        if pelo_nome is not None and coluna in mapeamento and mapeamento[coluna] != pelo_nome:
+            erros.append(f"A coluna '{coluna}' ({posicao}ª) seria lida como {mapeamento[coluna]}")
+    return mapeamento, erros
+
+
+def _list_values(valores):
+    """Alguns valores para a mensagem, com a contagem dos omitidos"""
+    texto = ', '.join(valores[:UNKNOWN_VALUES_SHOWN])
+    if len(valores) > UNKNOWN_VALUES_SHOWN:
+        texto += f" e mais {len(valores) - UNKNOWN_VALUES_SHOWN}"
+    return texto
+
+
+def validate_sample(amostra, conhecidas=None, regras=None):
+    """Relatório da amostra: colunas mapeadas, fração de datas válidas, erros (recusam a planilha) e avisos"""
+    mapeamento, erros = check_columns(list(amostra.columns))
+    avisos = []
+    amostra = amostra.dropna(how='all')
+    relatorio = {
+        'colunas': mapeamento,
+        'linhas_amostra': len(amostra),
+        'datas_validas': None,
+        'desconhecidas': {},
+        'erros': erros,
+        'avisos': avisos
+    }
+    if amostra.empty:
+        erros.append("A planilha não contém linhas de dados")
+    if erros:
+        return relatorio
+    
+    amostra = amostra.rename(columns=mapeamento)
+    # Mesma conversão da ingestão: datas ilegíveis viram NaT e a linha é descartada
+    validas = pd.to_datetime(amostra['data'], errors='coerce', format=infer_date_format(amostra['data'])).notna()
+    relatorio['datas_validas'] = float(validas.mean())
+    if relatorio['datas_validas'] < VALIDATION_MIN_DATE_RATIO:
+        erros.append(
+            f"Só {relatorio['datas_validas']:.0%} das datas da amostra são válidas "
+            f"(mínimo {VALIDATION_MIN_DATE_RATIO:.0%})"
+        )
+        return relatorio
+    if not validas.all():
+        avisos.append(f"{(~validas).sum()} de {len(amostra)} linhas da amostra sem data válida serão descartadas")
+    
+    if 'volume_impactado' in amostra:
+        volumes = amostra['volume_impactado'].dropna()
+        invalidos = int(pd.to_numeric(volumes, errors='coerce').isna().sum())
+        if invalidos:
+            avisos.append(f"{invalidos} volumes da amostra não são numéricos e serão lidos como 0")
+    else:
+        avisos.append("Sem coluna de volume: o volume impactado será 0")
+    if 'status' not in amostra:
+        avisos.append("Sem coluna de status: o status será N/A")
+    
+    # Categorias comparadas já traduzidas, como ficariam depois da ingestão
+    regras = regras or load_normalization_rules()
+    for coluna, valores in (conhecidas or {}).items():
+        traduzidas = normalize_column(amostra[coluna].dropna().astype('category'), regras['colunas'].get(coluna))
+        novas = sorted({str(valor) for valor in traduzidas.cat.categories} - set(valores))
+        if novas:
+            relatorio['desconhecidas'][coluna] = novas
+            avisos.append(f"{len(novas)} valor(es) de {coluna} ainda não vistos: {_list_values(novas)}")
+    return relatorio
+
+
+def validate_workbook(fonte, conhecidas=None, linhas=VALIDATION_SAMPLE_ROWS):
+    """Valida a planilha (caminho, arquivo ou bytes) lendo só o cabeçalho e as primeiras linhas"""
+    try:
+        amostra = read_sample(fonte, linhas)
+    except Exception as e:
+        # Arquivo corrompido ou que não é planilha: o motivo vem de openpyxl/xlrd/zipfile
+        return {
+            'colunas': {},
+            'linhas_amostra': 0,
+            'datas_validas': None,
+            'desconhecidas': {},
+            'erros': [f"Não foi possível ler a planilha: {e}"],
+            'avisos': []
+        }
+    return validate_sample(amostra, conhecidas)